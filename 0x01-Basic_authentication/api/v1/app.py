@@ -13,16 +13,27 @@ Usage:
 - Run the application by executing this script. The server will listen
   on the host and port specified in the environment variables
   API_HOST and API_PORT, or default to 0.0.0.0 and 5000, respectively.
+- The storage engine of the models is selected by the environment
+  variable STORAGE_TYPE: "json" (default) or "sqlite".
+- Request and phase latency histograms are recorded when the
+  environment variable API_METRICS is 1, see `api.v1.metrics`.
 """
 
 from os import getenv
+from api.v1.auth.path_matcher import ExcludedPathMatcher
+from api.v1.metrics import METRICS, TimedJSONProvider
 from api.v1.views import app_views
-from flask import Flask, jsonify, abort, request
+from flask import Flask, jsonify, abort, request, g
+import time
 from flask_cors import CORS
 
 # Create a Flask application instance
 app = Flask(__name__)
 
+# Time the JSON serialization of the responses
+if METRICS.enabled:
+    app.json = TimedJSONProvider(app)
+
 # Register the app_views blueprint with the application
 app.register_blueprint(app_views)
 
@@ -39,6 +50,13 @@ else:
     from api.v1.auth.auth import Auth
     auth = Auth()
 
+# Paths served without authentication, compiled once
+EXCLUDED_PATHS = ExcludedPathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/'
+])
+
 
 @app.errorhandler(404)
 def not_found(error) -> str:
@@ -82,19 +100,35 @@ def forbidden(error) -> str:
 @app.before_request
 def before_request():
     """Handler for filtering requests based on authorization"""
-    if auth is None:
-        return
-    excluded_paths = [
-                      '/api/v1/status/',
-                      '/api/v1/unauthorized/',
-                      '/api/v1/forbidden/'
-    ]
-    if not auth.require_auth(request.path, excluded_paths):
-        return
-    if auth.authorization_header(request) is None:
-        abort(401)
-    if auth.current_user(request) is None:
-        abort(403)
+    if METRICS.enabled:
+        g.metrics_start = time.perf_counter()
+    if auth is not None:
+        with METRICS.phase("require_auth"):
+            required = auth.require_auth(request.path, EXCLUDED_PATHS)
+        if required:
+            if auth.authorization_header(request) is None:
+                abort(401)
+            if auth.current_user(request) is None:
+                abort(403)
+    if METRICS.enabled:
+        g.metrics_view_start = time.perf_counter()
+
+
+@app.after_request
+def after_request(response):
+    """Handler recording the request and view durations, if enabled"""
+    if not METRICS.enabled or "metrics_start" not in g:
+        return response
+    now = time.perf_counter()
+    if "metrics_view_start" in g:
+        METRICS.observe("api_phase_duration_seconds", (("phase", "view"),),
+                        now - g.metrics_view_start)
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    METRICS.observe("api_request_duration_seconds",
+                    (("route", route), ("method", request.method),
+                     ("status", str(response.status_code))),
+                    now - g.metrics_start)
+    return response
 
 
 if __name__ == "__main__":
@@ -12,7 +12,8 @@ Classes:
 
 Methods:
     require_auth(self, path: str, excluded_paths: List[str]) -> bool:
-        Determines if a given path requires authentication.
+        Determines if a given path requires authentication, using a
+        compiled `ExcludedPathMatcher`.
 
     authorization_header(self, request=None) -> str:
         Returns the authorization header from the request.
@@ -22,7 +23,9 @@ Methods:
 """
 
 from flask import request
-from typing import List, TypeVar
+from typing import List, TypeVar, Union
+from api.v1.auth.path_matcher import ExcludedPathMatcher, \
+    compile_excluded_paths
 
 
 class Auth:
@@ -41,15 +44,20 @@ class Auth:
         current_user: Returns the current user based on the request.
     """
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], ExcludedPathMatcher]
+                     ) -> bool:
         """
         Determines if a given path requires authentication.
 
         Args:
             path (str): The path to check for authentication
                         requirement.
-            excluded_paths (List[str]): A list of paths that are
-                                        excluded from authentication.
+            excluded_paths (List[str] | ExcludedPathMatcher): The paths
+                        that are excluded from authentication, or
+                        their matcher compiled once at startup.
+                        A trailing slash is ignored and a '*' at the
+                        end of a path matches any suffix.
 
         Returns:
             bool: True if the path requires authentication,
@@ -68,17 +76,9 @@ class Auth:
         if not excluded_paths:
             return True
 
-        # Ensure the path ends with a slash for comparison
-        if not path.endswith('/'):
-            path += '/'
-
-        # Check if the path is in the excluded paths
-        for excluded_path in excluded_paths:
-            if excluded_path.endswith('/'):
-                if path == excluded_path:
-                    return False
-
-        return True
+        if not isinstance(excluded_paths, ExcludedPathMatcher):
+            excluded_paths = compile_excluded_paths(tuple(excluded_paths))
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """
@@ -11,7 +11,14 @@ Classes:
     BasicAuth: A class that provides methods for decoding
                Base64 authorization headers.
 
+Verified credentials are kept in a `CredentialCache`, sized by the
+environment variables BASIC_AUTH_CACHE_SIZE (0 disables it) and
+BASIC_AUTH_CACHE_TTL (in seconds).
+
 Methods:
+    extract_base64_authorization_header(self, authorization_header: str)
+        -> Optional[str]:
+        Extracts the Base64 part of a Basic Authorization header.
     decode_base64_authorization_header(self,
     base64_authorization_header: str) -> str:
         Decodes the Base64 authorization header to retrieve
@@ -26,16 +33,43 @@ Methods:
         Retrieves the User instance for the given request.
 """
 
+from os import getenv
 from typing import Optional, Tuple
 from api.v1.auth.auth import Auth
+from api.v1.auth.credential_cache import CredentialCache
+from api.v1.metrics import METRICS
 import base64  # Standard Library for Base64 encoding and decoding
 from models.user import User  # Import User model
-from typing import List, Optional
 
 
 class BasicAuth(Auth):
     """ Basic Authentication class """
 
+    def __init__(self) -> None:
+        """Initializes the cache of verified credentials."""
+        self.credential_cache = CredentialCache(
+            int(getenv("BASIC_AUTH_CACHE_SIZE", "1024")),
+            float(getenv("BASIC_AUTH_CACHE_TTL", "300")))
+
+    def extract_base64_authorization_header(
+            self, authorization_header: str) -> Optional[str]:
+        """
+        Extracts the Base64 part of the Authorization header.
+
+        Args:
+            authorization_header (str): The Authorization header.
+
+        Returns:
+            str: The part after "Basic ", or None if the header is
+                 missing or does not use the Basic scheme.
+        """
+        if authorization_header is None or \
+                not isinstance(authorization_header, str):
+            return None
+        if not authorization_header.startswith("Basic "):
+            return None
+        return authorization_header[len("Basic "):]
+
     def decode_base64_authorization_header(
             self, base64_authorization_header: str) -> Optional[str]:
         """
@@ -85,6 +119,9 @@ class BasicAuth(Auth):
             self, user_email: str, user_pwd: str) -> Optional[User]:
         """Retrieves a User instance based on email and password.
 
+        A password hashed with outdated parameters is rehashed with
+        the current ones.
+
         Args:
             user_email (str): The user's email address.
             user_pwd (str): The user's password.
@@ -98,11 +135,18 @@ class BasicAuth(Auth):
         if user_pwd is None or not isinstance(user_pwd, str):
             return None
         try:
-            users = User.search({"email": user_email})
+            with METRICS.phase("lookup"):
+                users = User.search({"email": user_email})
             if not users:
                 return None
             for u in users:
-                if u.is_valid_password(user_pwd):
+                with METRICS.phase("hash_verify"):
+                    valid = u.is_valid_password(user_pwd)
+                if valid:
+                    if u.password_needs_rehash():
+                        # Upgrade the hash now that the password is known
+                        u.password = user_pwd
+                        u.save()
                     return u
             return None
         except Exception:
@@ -114,41 +158,25 @@ class BasicAuth(Auth):
         Args:
             request: The Flask request object. Defaults to None.
 
+        A header seen recently is resolved from the credential cache
+        with a single `User.get()`.
+
         Returns:
             User: The User instance associated with the request,
             or None if not found.
         """
         auth_header = self.authorization_header(request)
-        b64_auth_header = self.extract_base64_authorization_header(auth_header)
-        decoded_b64 = self.decode_base64_authorization_header(b64_auth_header)
-        user_email, user_pwd = self.extract_user_credentials(decoded_b64)
+        with METRICS.phase("lookup"):
+            user = self.credential_cache.get(auth_header, User.get)
+        if user is not None:
+            return user
+        with METRICS.phase("decode"):
+            b64_auth_header = self.extract_base64_authorization_header(
+                auth_header)
+            decoded_b64 = self.decode_base64_authorization_header(
+                b64_auth_header)
+            user_email, user_pwd = self.extract_user_credentials(decoded_b64)
         user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is not None:
+            self.credential_cache.put(auth_header, user)
         return user
-
-    def require_auth(
-        self, path: Optional[str], excluded_paths: Optional[List[str]]
-    ) -> bool:
-        """Determine if a given path requires authentication.
-
-        Args:
-            path: The path to check (e.g., "/api/v1/status").
-            excluded_paths: A list of paths that are excluded from
-                            authentication. Wildcards ('*') are
-                            supported at the end of paths.
-
-        Returns:
-            True if the path requires authentication, False otherwise.
-        """
-        if path is None or not excluded_paths:
-            return True
-
-        path = path.rstrip('/')
-
-        for ep in excluded_paths:
-            if ep.endswith('*'):
-                if path.startswith(ep[:-1]):
-                    return False
-            elif path == ep.rstrip('/'):
-                return False
-
-        return True
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Module for the credential verification cache
+
+This module defines the `CredentialCache` class, a bounded LRU cache
+with a time-to-live that maps an `Authorization` header to the id of
+the user it authenticates, so that repeated requests with the same
+header skip the decoding, the lookup by email and the password hash.
+
+Headers are never stored: entries are keyed by an HMAC of the header
+with a secret generated at startup.
+
+Classes:
+    CredentialCache: A cache of verified Basic credentials.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Optional, TypeVar
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+
+
+class CredentialCache:
+    """
+    The `CredentialCache` class caches verified credentials.
+
+    Each entry holds the user id and the password hash the header was
+    verified against. An entry is dropped when it expires, when the
+    user no longer exists or when its password hash changed.
+
+    Attributes:
+        capacity (int): The maximum number of entries, 0 disables it.
+        ttl (float): The lifetime of an entry in seconds.
+        hits, misses, evictions (int): The usage counters.
+    """
+
+    def __init__(self, capacity: int = 1024, ttl: float = 300) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            capacity (int): The maximum number of entries.
+            ttl (float): The lifetime of an entry in seconds.
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._secret = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, authorization_header: str) -> bytes:
+        """Returns the keyed hash of the header."""
+        return hmac.new(self._secret, authorization_header.encode(),
+                        hashlib.sha256).digest()
+
+    def get(self, authorization_header: str,
+            get_user: Callable[[str], TypeVar('User')]
+            ) -> Optional[TypeVar('User')]:
+        """
+        Returns the user authenticated by the header, if cached.
+
+        Args:
+            authorization_header (str): The raw Authorization header.
+            get_user (Callable): Returns a user by id, e.g. `User.get`.
+
+        Returns:
+            User: The cached user, or None on a miss.
+        """
+        if self.capacity <= 0 or authorization_header is None:
+            return None
+        key = self._key(authorization_header)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        user_id, password, expires = entry
+        user = get_user(user_id)
+        with self._lock:
+            if user is None or user.password != password:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+        return user
+
+    def put(self, authorization_header: str, user: TypeVar('User')) -> None:
+        """
+        Caches the user authenticated by the header.
+
+        Args:
+            authorization_header (str): The raw Authorization header.
+            user (User): The user whose password matched.
+        """
+        if self.capacity <= 0 or authorization_header is None:
+            return
+        key = self._key(authorization_header)
+        entry = (user.id, user.password, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Returns the size and usage counters of the cache."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
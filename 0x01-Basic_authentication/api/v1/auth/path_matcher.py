@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Module for matching excluded paths
+
+This module defines the `ExcludedPathMatcher` class, which compiles a
+list of paths excluded from authentication once, so that checking a
+request path costs O(len(path)) whatever the number of patterns.
+
+Patterns follow the `require_auth` rules:
+    - A trailing slash is ignored on both the pattern and the path.
+    - A pattern ending with '*' matches every path starting with the
+      rest of the pattern.
+
+Classes:
+    ExcludedPathMatcher: A compiled set of excluded paths.
+
+Functions:
+    compile_excluded_paths(excluded_paths: Tuple[str, ...])
+        -> ExcludedPathMatcher:
+        Returns the matcher of a list of paths, cached.
+"""
+
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+
+class ExcludedPathMatcher:
+    """
+    The `ExcludedPathMatcher` class matches paths against patterns.
+
+    Exact patterns are kept in a set and wildcard prefixes in a
+    character trie, where the key None marks the end of a prefix.
+    """
+
+    def __init__(self, excluded_paths: Iterable[str]) -> None:
+        """
+        Compiles the excluded paths.
+
+        Args:
+            excluded_paths (Iterable[str]): The excluded path patterns.
+        """
+        self.patterns = tuple(excluded_paths)
+        self._exact = set()
+        self._prefixes = {}
+        for pattern in self.patterns:
+            if pattern.endswith('*'):
+                node = self._prefixes
+                for char in pattern[:-1]:
+                    node = node.setdefault(char, {})
+                node[None] = True
+            else:
+                self._exact.add(pattern.rstrip('/'))
+
+    def __len__(self) -> int:
+        """Returns the number of patterns."""
+        return len(self.patterns)
+
+    def match(self, path: str) -> bool:
+        """
+        Checks if a path is excluded.
+
+        Args:
+            path (str): The request path.
+
+        Returns:
+            bool: True if the path matches an excluded pattern.
+        """
+        path = path.rstrip('/')
+        if path in self._exact:
+            return True
+        node = self._prefixes
+        for char in path:
+            if None in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
+
+
+@lru_cache(maxsize=32)
+def compile_excluded_paths(
+        excluded_paths: Tuple[str, ...]) -> ExcludedPathMatcher:
+    """
+    Returns the matcher of a tuple of paths, cached.
+
+    Args:
+        excluded_paths (Tuple[str, ...]): The excluded path patterns.
+
+    Returns:
+        ExcludedPathMatcher: The compiled matcher.
+    """
+    return ExcludedPathMatcher(excluded_paths)
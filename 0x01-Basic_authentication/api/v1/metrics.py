@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Module for request instrumentation
+
+This module defines low-overhead latency histograms, filled per route
+and per phase of a request, and rendered in the Prometheus text format
+by `GET /api/v1/metrics`.
+
+Instrumentation is opt-in: it is enabled by the environment variable
+API_METRICS=1. When disabled, `phase()` returns a shared no-op timer
+and nothing is recorded.
+
+Phases:
+    require_auth: Matching the path against the excluded paths.
+    decode: Extracting and decoding the Basic credentials.
+    lookup: Finding the user, in the credential cache or by email.
+    hash_verify: Verifying the password against its hash.
+    view: Running the view, serialization included.
+    serialization: Serializing the JSON responses.
+
+Classes:
+    Histogram: A fixed-bucket histogram of durations.
+    Metrics: A registry of labelled histograms.
+    TimedJSONProvider: A Flask JSON provider timing serialization.
+
+Attributes:
+    METRICS (Metrics): The registry used by the API.
+"""
+
+from bisect import bisect_left
+from collections import deque
+from flask.json.provider import DefaultJSONProvider
+from os import getenv
+from typing import Dict, Iterable, List, Tuple
+import threading
+import time
+
+
+# Upper bounds of the buckets, in seconds: 10µs to 10s
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+           0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HELP = {
+    "api_request_duration_seconds":
+        "Duration of the requests, by route, method and status.",
+    "api_phase_duration_seconds":
+        "Duration of the phases of the requests."
+}
+
+
+class Histogram:
+    """
+    The `Histogram` class counts durations in fixed buckets.
+
+    Recording a value only appends it to a pending deque, which is
+    thread-safe without a lock; pending values are folded into the
+    buckets every FOLD_SIZE values and when the histogram is read.
+
+    Attributes:
+        bounds (Tuple[float, ...]): The upper bounds of the buckets,
+                                    the last bucket being +Inf.
+        counts (List[int]): The number of values of each bucket.
+        sum (float): The sum of the values.
+    """
+    FOLD_SIZE = 256
+
+    def __init__(self, bounds: Tuple[float, ...] = BUCKETS) -> None:
+        """
+        Initializes an empty histogram.
+
+        Args:
+            bounds (Tuple[float, ...]): The sorted bucket upper bounds.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        Records a value.
+
+        Args:
+            value (float): The duration in seconds.
+        """
+        self._pending.append(value)
+        if len(self._pending) >= self.FOLD_SIZE:
+            self._fold()
+
+    def _fold(self) -> None:
+        """Moves the pending values into the buckets."""
+        with self._lock:
+            pending = self._pending
+            while pending:
+                value = pending.popleft()
+                self.counts[bisect_left(self.bounds, value)] += 1
+                self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Returns a copy of the bucket counts and the sum."""
+        self._fold()
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Timer:
+    """Context manager recording its duration in a histogram."""
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    """Context manager doing nothing, used when metrics are disabled."""
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoTimer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+NO_TIMER = _NoTimer()
+
+
+class Metrics:
+    """
+    The `Metrics` class holds histograms by name and labels.
+
+    Attributes:
+        enabled (bool): Whether anything is recorded.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        """
+        Initializes an empty registry.
+
+        Args:
+            enabled (bool): Whether anything is recorded.
+        """
+        self.enabled = enabled
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self._phases: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, labels: tuple = ()) -> Histogram:
+        """
+        Returns the histogram of a name and labels, created if needed.
+
+        Args:
+            name (str): The metric name.
+            labels (tuple): The (label, value) pairs.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name: str, labels: tuple, value: float) -> None:
+        """
+        Records a duration, if enabled.
+
+        Args:
+            name (str): The metric name.
+            labels (tuple): The (label, value) pairs.
+            value (float): The duration in seconds.
+        """
+        if self.enabled:
+            self.histogram(name, labels).observe(value)
+
+    def phase(self, name: str):
+        """
+        Returns a context manager timing a phase of the request.
+
+        Args:
+            name (str): The phase name.
+
+        Returns:
+            A context manager, recording nothing if disabled.
+        """
+        if not self.enabled:
+            return NO_TIMER
+        histogram = self._phases.get(name)
+        if histogram is None:
+            histogram = self._phases[name] = self.histogram(
+                "api_phase_duration_seconds", (("phase", name),))
+        return _Timer(histogram)
+
+    def render(self) -> str:
+        """
+        Renders every histogram in the Prometheus text format.
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            items = sorted(self._histograms.items())
+        lines = []
+        current = None
+        for (name, labels), histogram in items:
+            if name != current:
+                current = name
+                lines.append("# HELP {} {}".format(name, HELP.get(name, "")))
+                lines.append("# TYPE {} histogram".format(name))
+            lines.extend(_render_histogram(name, labels, histogram))
+        return "\n".join(lines) + "\n"
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    The `TimedJSONProvider` class records the `serialization` phase of
+    every `jsonify()` in `METRICS`.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        """Serializes `obj` to JSON, timed."""
+        with METRICS.phase("serialization"):
+            return super().dumps(obj, **kwargs)
+
+
+def _format_labels(labels: Iterable[tuple]) -> str:
+    """Returns labels as `{k="v",...}`, escaped, or '' if none."""
+    pairs = ['{}="{}"'.format(k, str(v).replace('\\', '\\\\')
+                              .replace('"', '\\"').replace('\n', '\\n'))
+             for k, v in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _render_histogram(name: str, labels: tuple,
+                      histogram: Histogram) -> List[str]:
+    """Returns the bucket, sum and count lines of a histogram."""
+    counts, total = histogram.snapshot()
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds + (float("inf"),), counts):
+        cumulative += count
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append("{}_bucket{} {}".format(
+            name, _format_labels(labels + (("le", le),)), cumulative))
+    lines.append("{}_sum{} {!r}".format(name, _format_labels(labels), total))
+    lines.append("{}_count{} {}".format(name, _format_labels(labels),
+                                        cumulative))
+    return lines
+
+
+METRICS = Metrics(getenv("API_METRICS", "0") == "1")
@@ -3,6 +3,10 @@
 """
 from flask import jsonify, abort
 from api.v1.views import app_views
+from api.v1.metrics import METRICS
+from models.base import Base
+import models
+import models.stats
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
@@ -11,8 +15,15 @@ def status() -> str:
     GET /api/v1/status
     Return:
       - a JSON object indicating the status of the API.
+      - while models load in the background, their progress by object
+        type under "loading".
     """
-    return jsonify({"status": "OK"})
+    status = {"status": "OK"}
+    progress = models.storage.load_progress()
+    if progress:
+        status["loading"] = {s_class.lower() + 's': p
+                             for s_class, p in progress.items()}
+    return jsonify(status)
 
 
 @app_views.route('/stats/', strict_slashes=False)
@@ -22,13 +33,44 @@ def stats() -> str:
     Return:
       - a JSON object containing the number of each object in the database.
       - For example, the number of users.
+      - the number created in the last hour and day, by object type.
+    Counters are maintained on save and remove: storage is not queried.
     """
-    from models.user import User
-    stats = {}
-    stats['users'] = User.count()
+    stats = {'created_last_hour': {}, 'created_last_day': {}}
+    for cls in model_classes(Base):
+        key = cls.__name__.lower() + 's'
+        counters = models.stats.snapshot(cls)
+        stats[key] = counters['count']
+        stats['created_last_hour'][key] = counters['created_last_hour']
+        stats['created_last_day'][key] = counters['created_last_day']
     return jsonify(stats)
 
 
+def model_classes(cls: type) -> list:
+    """
+    Return every subclass of `cls`, recursively.
+    """
+    classes = []
+    for subclass in cls.__subclasses__():
+        classes.append(subclass)
+        classes.extend(model_classes(subclass))
+    return classes
+
+
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics() -> str:
+    """
+    GET /api/v1/metrics
+    Return:
+      - the request and phase latency histograms in the Prometheus
+        text format, or a 404 error if API_METRICS is not enabled.
+    """
+    if not METRICS.enabled:
+        abort(404)
+    return METRICS.render(), 200, {
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
 def unauthorized() -> str:
     """
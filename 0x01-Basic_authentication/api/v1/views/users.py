@@ -2,18 +2,140 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, stream_with_context
+from models.base import parse_timestamp
 from models.user import User
+import base64
+import binascii
+import json
+
+
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = 100
+MAX_BULK_SIZE = 10000
+# Each created user costs a password hash
+MAX_BULK_CREATE_SIZE = 100
+
+
+def encode_cursor(user_id: str) -> str:
+    """ Opaque cursor token for the page starting after `user_id`
+    """
+    return base64.urlsafe_b64encode(user_id.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> str:
+    """ User ID encoded in a cursor token, ValueError if invalid
+    """
+    try:
+        return base64.b64decode(cursor.encode(), altchars=b"-_",
+                                validate=True).decode()
+    except (binascii.Error, UnicodeError):
+        raise ValueError("invalid cursor")
+
+
+def project(user: User, fields: list = None) -> dict:
+    """ JSON representation of `user`, restricted to `fields` if set
+    """
+    user_json = user.to_json()
+    if fields is None:
+        return user_json
+    return {k: user_json[k] for k in fields if k in user_json}
+
+
+def user_filters() -> dict:
+    """ Search attributes of the filters of the query string,
+    ValueError if a date is invalid
+    """
+    filters = {}
+    email_prefix = request.args.get("email_prefix")
+    if email_prefix:
+        filters["email__startswith"] = email_prefix
+    email_domain = request.args.get("email_domain")
+    if email_domain:
+        filters["email__endswith"] = "@" + email_domain
+    for arg, key in (("created_after", "created_at__gte"),
+                     ("created_before", "created_at__lt")):
+        value = request.args.get(arg)
+        if value:
+            try:
+                filters[key] = parse_timestamp(value)
+            except ValueError:
+                raise ValueError("{} must be formatted as {}".format(
+                    arg, "YYYY-MM-DDTHH:MM:SS"))
+    return filters
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: page size, up to 1000; enables pagination
+      - cursor: next_cursor of the previous page; enables pagination
+      - fields: comma separated attributes to return, e.g. id,email
+      - email_prefix: only emails starting with it
+      - email_domain: only emails of this domain, e.g. example.com
+      - created_after: only users created at or after this date
+      - created_before: only users created before this date
+        (dates formatted as YYYY-MM-DDTHH:MM:SS, UTC)
+    Return:
+      - list of all matching User objects JSON represented
+      - with pagination: {"users": [...], "next_cursor": token or null},
+        users being ordered by ID
+      - 400 if limit, cursor or a date is invalid
+    """
+    fields = request.args.get("fields")
+    if fields is not None:
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    try:
+        filters = user_filters()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+    if limit is None and cursor is None:
+        all_users = [project(user, fields)
+                     for user in User.search(filters)]
+        return jsonify(all_users)
+
+    try:
+        limit = DEFAULT_PAGE_SIZE if limit is None else int(limit)
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'error': "limit must be between 1 and {}".format(
+            MAX_PAGE_SIZE)}), 400
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': "invalid cursor"}), 400
+    users, next_after = User.page(after, limit, filters)
+    return jsonify({
+        "users": [project(user, fields) for user in users],
+        "next_cursor": encode_cursor(next_after) if next_after else None
+    })
+
+
+@app_views.route('/users/export', methods=['GET'], strict_slashes=False)
+def export_users() -> str:
+    """ GET /api/v1/users/export
+    Query parameters (optional):
+      - fields: comma separated attributes to return, e.g. id,email
     Return:
-      - list of all User objects JSON represented
+      - every User object JSON represented, one per line (NDJSON),
+        streamed in ID order while users are read batch by batch
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    fields = request.args.get("fields")
+    if fields is not None:
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+
+    def generate():
+        for user in User.iter_all():
+            yield json.dumps(project(user, fields)) + "\n"
+
+    return Response(stream_with_context(generate()),
+                    mimetype="application/x-ndjson")
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -120,3 +242,137 @@ def update_user(user_id: str = None) -> str:
         user.last_name = rj.get('last_name')
     user.save()
     return jsonify(user.to_json()), 200
+
+
+def bulk_items(max_size: int = MAX_BULK_SIZE):
+    """ List of at most `max_size` items of a bulk request body, or a
+    (response, status) error tuple
+    """
+    try:
+        items = request.get_json()
+    except Exception:
+        items = None
+    if not isinstance(items, list):
+        return jsonify({'error': "Wrong format"}), 400
+    if len(items) > max_size:
+        return jsonify({'error': "At most {} items".format(
+            max_size)}), 400
+    return items
+
+
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def create_users() -> str:
+    """ POST /api/v1/users/bulk
+    JSON body:
+      - list of objects with the POST /api/v1/users attributes
+    Return:
+      - list of results, in the order of the body:
+        {"status": 201, "user": <User JSON>} or
+        {"status": 400, "error": <message>}
+      - valid users are all saved with a single write
+      - 400 if the body isn't a list of at most MAX_BULK_CREATE_SIZE
+        items
+    """
+    items = bulk_items(MAX_BULK_CREATE_SIZE)
+    if not isinstance(items, list):
+        return items
+    results = []
+    users = []
+    passwords = []
+    for item in items:
+        error_msg = None
+        if not isinstance(item, dict):
+            error_msg = "Wrong format"
+        elif item.get("email", "") == "":
+            error_msg = "email missing"
+        elif item.get("password", "") == "" or \
+                not isinstance(item.get("password"), str):
+            error_msg = "password missing"
+        if error_msg is not None:
+            results.append({"status": 400, "error": error_msg})
+            continue
+        user = User()
+        user.email = item.get("email")
+        user.first_name = item.get("first_name")
+        user.last_name = item.get("last_name")
+        users.append(user)
+        passwords.append(item.get("password"))
+        results.append(user)
+    try:
+        User.set_passwords(users, passwords)
+        User.save_many(users)
+    except Exception as e:
+        return jsonify({'error': "Can't create Users: {}".format(e)}), 400
+    results = [r if isinstance(r, dict) else
+               {"status": 201, "user": r.to_json()} for r in results]
+    return jsonify(results), 200
+
+
+@app_views.route('/users/bulk', methods=['PUT'], strict_slashes=False)
+def update_users() -> str:
+    """ PUT /api/v1/users/bulk
+    JSON body:
+      - list of objects with the id of a User and, optionally,
+        first_name and last_name
+    Return:
+      - list of results, in the order of the body:
+        {"status": 200, "user": <User JSON>} or
+        {"status": 400 or 404, "error": <message>}
+      - updated users are all saved with a single write
+      - 400 if the body isn't a list
+    """
+    items = bulk_items()
+    if not isinstance(items, list):
+        return items
+    results = []
+    users = []
+    for item in items:
+        if not isinstance(item, dict) or \
+                not isinstance(item.get("id"), str):
+            results.append({"status": 400, "error": "Wrong format"})
+            continue
+        user = User.get(item.get("id"))
+        if user is None:
+            results.append({"status": 404, "error": "Not found"})
+            continue
+        if item.get('first_name') is not None:
+            user.first_name = item.get('first_name')
+        if item.get('last_name') is not None:
+            user.last_name = item.get('last_name')
+        users.append(user)
+        results.append(user)
+    User.save_many(users)
+    results = [r if isinstance(r, dict) else
+               {"status": 200, "user": r.to_json()} for r in results]
+    return jsonify(results), 200
+
+
+@app_views.route('/users/bulk', methods=['DELETE'], strict_slashes=False)
+def delete_users() -> str:
+    """ DELETE /api/v1/users/bulk
+    JSON body:
+      - list of User IDs
+    Return:
+      - list of results, in the order of the body:
+        {"status": 200, "id": <ID>} or
+        {"status": 400 or 404, "error": <message>}
+      - users are all removed with a single write
+      - 400 if the body isn't a list
+    """
+    items = bulk_items()
+    if not isinstance(items, list):
+        return items
+    results = []
+    users = []
+    for user_id in items:
+        if not isinstance(user_id, str):
+            results.append({"status": 400, "error": "Wrong format"})
+            continue
+        user = User.get(user_id)
+        if user is None:
+            results.append({"status": 404, "error": "Not found"})
+            continue
+        users.append(user)
+        results.append({"status": 200, "id": user_id})
+    User.remove_many(users)
+    return jsonify(results), 200
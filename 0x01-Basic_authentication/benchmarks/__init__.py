@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+""" Benchmarks of the models and the API
+
+Most benchmarks measure in a fresh process per configuration, started
+by `run_child()` in a temporary directory; the child checks
+`is_child()` to measure instead of starting children.
+"""
+from os import path
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+
+def is_child() -> bool:
+    """ Whether this process was started by `run_child()`
+    """
+    return os.environ.get("BENCHMARK_CHILD") == "1"
+
+
+def run_child(module: str, *args, env: dict = None,
+              setup: str = None) -> dict:
+    """ Run `python3 -m <module> <args>` in a new temporary directory
+    and return the JSON printed on the last line of its output
+
+    `env` updates the environment of the child, a None value removing
+    the variable. `setup`, Python code, is run first in the same
+    directory and environment, e.g. to seed it.
+    """
+    child_env = dict(os.environ, PYTHONPATH=ROOT)
+    for key, value in (env or {}).items():
+        if value is None:
+            child_env.pop(key, None)
+        else:
+            child_env[key] = value
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if setup is not None:
+            subprocess.run([sys.executable, "-c", setup],
+                           cwd=tmp_dir, env=child_env, check=True)
+        out = subprocess.run(
+            [sys.executable, "-m", module] + [str(arg) for arg in args],
+            cwd=tmp_dir, env=dict(child_env, BENCHMARK_CHILD="1"),
+            check=True, stdout=subprocess.PIPE)
+    return json.loads(out.stdout.splitlines()[-1])
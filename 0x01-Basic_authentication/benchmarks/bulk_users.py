@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+""" Benchmark of bulk saves
+
+Saves N users one `save()` at a time, then with a single
+`User.save_many()`, for each storage configuration, and reports the
+users saved per second, as JSON.
+
+Usage: python3 -m benchmarks.bulk_users [N]
+"""
+from benchmarks import is_child, run_child
+import json
+import sys
+import time
+
+
+CONFIGURATIONS = {
+    "json_file": {"STORAGE_TYPE": "json", "MODELS_STORAGE_MODE": "file"},
+    "json_journal": {"STORAGE_TYPE": "json",
+                     "MODELS_STORAGE_MODE": "journal"},
+    "sqlite": {"STORAGE_TYPE": "sqlite"},
+}
+
+
+def _users(n: int) -> list:
+    """ Return `n` new users with an already hashed password
+    """
+    from models.user import User
+
+    return [User(email="user{}@example.com".format(i),
+                 _password="scrypt$16384$8$1$salt$hash")
+            for i in range(n)]
+
+
+def measure(n: int) -> dict:
+    """ Time per-item and bulk saves of `n` users in the current
+    directory, with the storage engine of the environment
+    """
+    from models.user import User
+
+    User.load_from_file()
+
+    users = _users(n)
+    start = time.perf_counter()
+    for user in users:
+        user.save()
+    User.flush()
+    per_item = time.perf_counter() - start
+
+    users = _users(n)
+    start = time.perf_counter()
+    User.save_many(users)
+    User.flush()
+    bulk = time.perf_counter() - start
+    assert User.count() == 2 * n
+    return {
+        "users": n,
+        "per_item_users_per_sec": round(n / per_item, 1),
+        "bulk_users_per_sec": round(n / bulk, 1),
+    }
+
+
+def main():
+    """ Run the measure in a subprocess for each configuration
+    """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    if is_child():
+        print(json.dumps(measure(n)))
+        return
+    results = {name: run_child("benchmarks.bulk_users", n, env=config)
+               for name, config in CONFIGURATIONS.items()}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+""" Benchmark of the API cold start with eager and background loading
+
+For each MODELS_LOAD_MODE, seeds N users in an ndjson file and, in a
+fresh process, measures the seconds from startup until:
+- the app is imported and ready to serve
+- the first GET /api/v1/status answers
+- the first GET /api/v1/users/<id> answers
+- every user is loaded
+
+and reports them as JSON.
+
+Usage: python3 -m benchmarks.cold_start [N]
+"""
+from benchmarks import is_child, run_child
+import json
+import sys
+import time
+
+
+MODES = ("eager", "background")
+
+
+def measure(n: int) -> dict:
+    """ Start the API over the `n` users of the current directory
+    """
+    start = time.perf_counter()
+    import api.v1.app as app_module
+    from models.user import User
+
+    results = {"app_ready": time.perf_counter() - start}
+    app_module.auth = None
+    client = app_module.app.test_client()
+    response = client.get("/api/v1/status")
+    assert response.status_code == 200
+    results["first_status"] = time.perf_counter() - start
+    results["loading"] = "loading" in response.get_json()
+    user_id = "{:08d}-0000-4000-8000-000000000000".format(n // 2)
+    response = client.get("/api/v1/users/{}".format(user_id))
+    assert response.status_code == 200
+    results["first_get"] = time.perf_counter() - start
+    assert User.count() == n
+    results["fully_loaded"] = time.perf_counter() - start
+    return {key: round(value, 3) if type(value) is float else value
+            for key, value in results.items()}
+
+
+def main():
+    """ Seed once, then measure each mode in its own process
+    """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    if is_child():
+        print(json.dumps(measure(n)))
+        return
+    results = {"users": n}
+    for mode in MODES:
+        results[mode] = run_child(
+            "benchmarks.cold_start", n,
+            env={"STORAGE_TYPE": "json", "MODELS_LOAD_MODE": mode},
+            setup="from benchmarks.suite import seed; "
+                  "seed({}, 'ndjson')".format(n))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+""" Stress test of concurrent CRUD on the models
+
+THREADS threads create, read, search, update and remove users for a
+few seconds, for each storage configuration, while the whole class is
+regularly listed and written to file. Each thread only updates and
+removes the users it created, so the expected final state is known.
+
+Afterwards, checks that no call failed, that the count, `get()` and
+the email index agree with the expected users, and that reloading
+from disk gives them back. Reports the operations per second and the
+check results, as JSON, and exits with status 1 if a check failed.
+
+Usage: python3 -m benchmarks.concurrent_crud [SECONDS] [THREADS]
+"""
+from benchmarks import is_child, run_child
+import json
+import random
+import sys
+import threading
+import time
+import traceback
+
+
+CONFIGURATIONS = {
+    "json_file": {"STORAGE_TYPE": "json", "MODELS_STORAGE_MODE": "file"},
+    "json_file_coalesced": {"STORAGE_TYPE": "json",
+                            "MODELS_STORAGE_MODE": "file",
+                            "MODELS_FLUSH_INTERVAL_MS": "20"},
+    "json_journal": {"STORAGE_TYPE": "json",
+                     "MODELS_STORAGE_MODE": "journal",
+                     "MODELS_JOURNAL_COMPACT_THRESHOLD": "200"},
+    "sqlite": {"STORAGE_TYPE": "sqlite"},
+}
+
+
+def _new_user(thread: int, i: int):
+    """ Return a new user with an already hashed password
+    """
+    from models.user import User
+
+    return User(email="t{}-{}@example.com".format(thread, i),
+                first_name="First", last_name="Last",
+                _password="scrypt$16384$8$1$salt$hash")
+
+
+def _worker(thread: int, deadline: float, shared: list, own: dict,
+            ops: list, errors: list):
+    """ Run random operations until `deadline`
+    """
+    from models.user import User
+
+    rng = random.Random(thread)
+    i = 0
+    while time.monotonic() < deadline:
+        op = rng.random()
+        try:
+            if op < 0.2 or not own:
+                user = _new_user(thread, i)
+                i += 1
+                user.save()
+                own[user.id] = user.email
+                shared.append(user.id)
+            elif op < 0.5:
+                User.get(shared[rng.randrange(len(shared))])
+            elif op < 0.7:
+                email = own[rng.choice(list(own))]
+                found = User.search({"email": email})
+                assert len(found) == 1, "{} found {}".format(
+                    email, len(found))
+            elif op < 0.85:
+                user = User.get(rng.choice(list(own)))
+                user.last_name = "Last{}".format(i)
+                user.save()
+            elif op < 0.95:
+                user_id = rng.choice(list(own))
+                User.get(user_id).remove()
+                del own[user_id]
+            elif op < 0.99:
+                for user in User.all():
+                    user.to_json()
+            else:
+                User.save_to_file()
+            ops[thread] += 1
+        except Exception:
+            errors.append(traceback.format_exc())
+
+
+def measure(seconds: float, threads: int) -> dict:
+    """ Hammer the storage of the environment from `threads` threads
+    """
+    from models.user import User
+
+    User.load_from_file()
+    shared = [_new_user(-1, 0)]
+    shared[0].save()
+    shared = [shared[0].id]
+    owns = [{} for _ in range(threads)]
+    ops = [0] * threads
+    errors = []
+    deadline = time.monotonic() + seconds
+    workers = [threading.Thread(target=_worker,
+                                args=(t, deadline, shared, owns[t], ops,
+                                      errors))
+               for t in range(threads)]
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - start
+    User.flush()
+
+    expected = {shared[0]: "t-1-0@example.com"}
+    for own in owns:
+        expected.update(own)
+    failures = []
+    if User.count() != len(expected):
+        failures.append("count {} != {}".format(User.count(), len(expected)))
+    for user_id, email in expected.items():
+        user = User.get(user_id)
+        if user is None or user.email != email:
+            failures.append("get {}".format(user_id))
+        elif User.search({"email": email}) != [user]:
+            failures.append("search {}".format(email))
+    User.load_from_file()
+    reloaded = {user.id for user in User.all()}
+    if reloaded != set(expected):
+        failures.append("reload {} != {}".format(len(reloaded),
+                                                 len(expected)))
+    return {
+        "threads": threads,
+        "ops_per_sec": round(sum(ops) / elapsed, 1),
+        "users": len(expected),
+        "errors": errors[:5],
+        "error_count": len(errors),
+        "failures": failures[:5],
+        "ok": not errors and not failures
+    }
+
+
+def main():
+    """ Run the stress test in a subprocess for each configuration
+    """
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    if is_child():
+        print(json.dumps(measure(seconds, threads)))
+        return
+    results = {name: run_child("benchmarks.concurrent_crud", seconds,
+                               threads, env=config)
+               for name, config in CONFIGURATIONS.items()}
+    print(json.dumps(results, indent=2))
+    if not all(result["ok"] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+""" Memory benchmark of loaded User objects
+
+Loads N users from a generated file, in a fresh process, and reports
+the bytes used per user, as JSON.
+
+Usage: python3 -m benchmarks.memory_users [N]
+"""
+from benchmarks import is_child, run_child
+import base64
+import json
+import os
+import sys
+import tracemalloc
+
+
+def measure(n: int) -> dict:
+    """ Load `n` users in the current directory and measure memory
+    """
+    from models.engine.json_storage import DATA
+    from models.user import User
+
+    for i in range(n):
+        # A random hash of the default scrypt format, since hashing
+        # every password for real would take minutes
+        password = "scrypt$16384$8$1${}${}".format(
+            base64.b64encode(os.urandom(16)).decode().rstrip("="),
+            base64.b64encode(os.urandom(32)).decode().rstrip("="))
+        user = User(email="user{}@example.com".format(i),
+                    first_name="First", last_name="Last{}".format(i),
+                    _password=password)
+        DATA.setdefault('User', {})[user.id] = user
+    User.save_to_file()
+
+    tracemalloc.start()
+    User.load_from_file()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "users": n,
+        "bytes_per_user": round(current / n, 1),
+        "peak_bytes_per_user": round(peak / n, 1)
+    }
+
+
+def main():
+    """ Run the measure in a subprocess
+    """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    if is_child():
+        print(json.dumps(measure(n)))
+        return
+    print(json.dumps(run_child("benchmarks.memory_users", n), indent=2))
+
+
+if __name__ == "__main__":
+    main()
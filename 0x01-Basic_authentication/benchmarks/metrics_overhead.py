@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+""" Benchmark of the request instrumentation overhead
+
+Reports, in microseconds, the cost of the instrumentation of one
+request (two timestamps, four phases and two observations), enabled
+and disabled, and the time of a `GET /api/v1/status` through the
+Flask test client with the metrics enabled and disabled, as JSON.
+
+Usage: python3 -m benchmarks.metrics_overhead [REQUESTS]
+"""
+import json
+import sys
+import time
+
+
+def _us_per_call(func, calls: int) -> float:
+    """ Return the mean time of `func()` in microseconds
+    """
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return round((time.perf_counter() - start) / calls * 1e6, 3)
+
+
+def _instrumented_request(metrics) -> None:
+    """ Everything recorded for one authenticated request
+    """
+    start = time.perf_counter()
+    for phase in ("require_auth", "lookup", "decode", "serialization"):
+        with metrics.phase(phase):
+            pass
+    now = time.perf_counter()
+    metrics.observe("api_phase_duration_seconds", (("phase", "view"),),
+                    now - start)
+    metrics.observe("api_request_duration_seconds",
+                    (("route", "/api/v1/status"), ("method", "GET"),
+                     ("status", "200")), now - start)
+
+
+def main():
+    """ Run the benchmark
+    """
+    from api.v1.metrics import Metrics, METRICS
+    import api.v1.app
+
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    enabled = Metrics(True)
+    disabled = Metrics(False)
+    results = {
+        "instrumentation_us_enabled": _us_per_call(
+            lambda: _instrumented_request(enabled), requests * 10),
+        "instrumentation_us_disabled": _us_per_call(
+            lambda: _instrumented_request(disabled), requests * 10),
+    }
+
+    api.v1.app.auth = None
+    client = api.v1.app.app.test_client()
+    for flag in (False, True, False, True):
+        METRICS.enabled = flag
+        key = "request_us_{}".format("enabled" if flag else "disabled")
+        results[key] = _us_per_call(
+            lambda: client.get("/api/v1/status"), requests)
+    METRICS.enabled = False
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
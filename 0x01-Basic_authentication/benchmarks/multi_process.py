@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+""" Benchmark of the SQLite storage shared between processes
+
+A writer process and a reader process share one SQLite database, as
+API workers do. The reader keeps `get()`-ing users while the writer
+updates, removes and creates some; reports how long each change took
+to be seen by the reader, and the `get()` throughput of a process with
+and without its cache, as JSON.
+
+Usage: python3 -m benchmarks.multi_process [N]
+"""
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+
+CHANGES = 20
+
+
+def _setup(cache_size: int):
+    """ Select the SQLite storage of the current directory
+    """
+    os.environ["MODELS_SQLITE_CACHE_SIZE"] = str(cache_size)
+    import models
+    from models.user import User
+
+    models.use_storage("sqlite")
+    User.load_from_file()
+    return User
+
+
+def _get_rate(User, ids: list, seconds: float = 1) -> float:
+    """ Return the `get()` calls per second over `ids`
+    """
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        User.get(ids[calls % len(ids)])
+        calls += 1
+    return round(calls / (time.perf_counter() - start), 1)
+
+
+def reader(tmp_dir: str, ids: list, ready, changes, results):
+    """ Warm the cache, then wait for each change of the writer
+    """
+    os.chdir(tmp_dir)
+    User = _setup(10000)
+    for user_id in ids:
+        User.get(user_id)
+    ready.set()
+    delays = []
+    for _ in range(CHANGES):
+        kind, user_id, value, written = changes.get()
+        while True:
+            user = User.get(user_id)
+            if kind == "update" and user and user.last_name == value:
+                break
+            if kind == "remove" and user is None:
+                break
+            if kind == "create" and user is not None:
+                break
+        delays.append(time.time() - written)
+    delays.sort()
+    results.put({
+        "changes_seen": len(delays),
+        "propagation_p50_us": round(delays[len(delays) // 2] * 1e6, 1),
+        "propagation_max_us": round(delays[-1] * 1e6, 1)
+    })
+
+
+def main():
+    """ Run the writer here and the reader in a second process
+    """
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, root)
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        User = _setup(0)
+        users = [User(email="user{}@example.com".format(i),
+                      _password="scrypt$16384$8$1$salt$hash")
+                 for i in range(n)]
+        User.save_many(users)
+        ids = [user.id for user in users]
+        results = {"users": n, "get_per_sec_uncached": _get_rate(User, ids)}
+
+        ready, changes, queue = ctx.Event(), ctx.Queue(), ctx.Queue()
+        process = ctx.Process(target=reader,
+                              args=(tmp_dir, ids, ready, changes, queue))
+        process.start()
+        ready.wait()
+        for i in range(CHANGES):
+            user = users[i]
+            if i % 4 == 3:
+                user.remove()
+                change = ("remove", user.id, None)
+            elif i % 4 == 2:
+                user = User(email="new{}@example.com".format(i))
+                user.save()
+                change = ("create", user.id, None)
+            else:
+                user.last_name = "Last{}".format(i)
+                user.save()
+                change = ("update", user.id, user.last_name)
+            changes.put(change + (time.time(),))
+            time.sleep(0.01)
+        results.update(queue.get(timeout=60))
+        process.join()
+
+        import models.engine.sqlite_storage as sqlite_storage
+        sqlite_storage.CACHE_SIZE = 10000
+        for user_id in ids:
+            User.get(user_id)
+        results["get_per_sec_cached"] = _get_rate(User, ids)
+        os.chdir(root)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
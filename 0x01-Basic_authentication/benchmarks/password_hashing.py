@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Benchmark of password verification
+
+Reports the password verifications per second of each algorithm with
+one thread, and through the verification pool with every core busy,
+as JSON.
+
+Usage: python3 -m benchmarks.password_hashing [SECONDS]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import time
+
+
+def _rate(func, seconds: float, threads: int = 1) -> float:
+    """ Return how many calls of `func` per second `threads` make
+    """
+    deadline = time.monotonic() + seconds
+
+    def worker() -> int:
+        calls = 0
+        while time.monotonic() < deadline:
+            func()
+            calls += 1
+        return calls
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        calls = sum(pool.map(lambda _: worker(), range(threads)))
+    return round(calls / (time.monotonic() - start), 1)
+
+
+def main():
+    """ Run the benchmark
+    """
+    import models.password as password
+
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    cores = os.cpu_count() or 1
+    results = {"cores": cores, "pool_workers": password.VERIFY_WORKERS}
+    for algorithm in ("scrypt", "pbkdf2_sha256"):
+        password.HASH_ALGORITHM = algorithm
+        encoded = password.hash_password("correct horse")
+        assert password.verify_password("correct horse", encoded)
+        single = _rate(
+            lambda: password.verify_password("correct horse", encoded),
+            seconds)
+        pooled = _rate(
+            lambda: password.verify_password_in_pool("correct horse",
+                                                     encoded),
+            seconds, threads=4 * cores)
+        results[algorithm] = {
+            "verifications_per_sec_one_thread": single,
+            "verifications_per_sec_pool": pooled,
+            "verifications_per_sec_per_core": round(pooled / cores, 1)
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+""" Benchmark of excluded path matching
+
+Compares the previous `require_auth` loop over the excluded paths with
+`ExcludedPathMatcher` for a growing number of patterns, checks that
+both give the same answers and reports the time per call in
+nanoseconds, as JSON.
+
+Usage: python3 -m benchmarks.path_matching
+"""
+import json
+import time
+
+
+def loop_require_auth(path: str, excluded_paths: list) -> bool:
+    """ The per-request loop `require_auth` used before the matcher
+    """
+    if path is None or not excluded_paths:
+        return True
+    path = path.rstrip('/')
+    for ep in excluded_paths:
+        if ep.endswith('*'):
+            if path.startswith(ep[:-1]):
+                return False
+        elif path == ep.rstrip('/'):
+            return False
+    return True
+
+
+def _ns_per_call(func, paths: list, repeat: int = 20) -> float:
+    """ Return the mean time of `func` over `paths` in nanoseconds
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            func(path)
+    elapsed = time.perf_counter() - start
+    return round(elapsed / (repeat * len(paths)) * 1e9, 1)
+
+
+def main():
+    """ Run the benchmark
+    """
+    from api.v1.auth.path_matcher import ExcludedPathMatcher
+
+    results = []
+    for n in (3, 30, 300, 3000):
+        patterns = []
+        for i in range(n):
+            if i % 2:
+                patterns.append("/api/v1/public{}/*".format(i))
+            else:
+                patterns.append("/api/v1/open{}/".format(i))
+        paths = ["/api/v1/users", "/api/v1/users/123/", "/api/v1/open0",
+                 "/api/v1/public1/doc", "/api/v1/open{}/".format(n - 2),
+                 "/api/v1/public{}".format(n - 1), "/", ""]
+        matcher = ExcludedPathMatcher(patterns)
+        for path in paths:
+            assert loop_require_auth(path, patterns) == \
+                (not matcher.match(path)), path
+        results.append({
+            "patterns": n,
+            "loop_ns": _ns_per_call(
+                lambda p: loop_require_auth(p, patterns), paths),
+            "matcher_ns": _ns_per_call(matcher.match, paths)
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
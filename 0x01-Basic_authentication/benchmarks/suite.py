@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+""" Benchmark suite of the models, the authentication and the API
+
+For each N, seeds N users in a temporary directory and, in a fresh
+process, measures:
+- "models": `Base` calls (load, get, indexed and scanned search, count,
+  page, save, save_to_file)
+- "auth": `BasicAuth.current_user` with and without the credential
+  cache
+- "api": requests through the Flask test client
+
+Each case reports its throughput and its p50/p99 latency in
+microseconds, and each N its peak resident memory, as JSON that can be
+diffed between commits. Every case runs for BENCHMARK_SECONDS (default
+1) and at least once.
+
+The storage engine and its settings are taken from the environment
+(STORAGE_TYPE, MODELS_*), like the API does.
+
+Usage: python3 -m benchmarks.suite [N ...]
+"""
+from benchmarks import is_child, run_child
+from types import SimpleNamespace
+import base64
+import json
+import os
+import random
+import resource
+import sys
+import time
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+EMAIL = "user0@example.com"
+PASSWORD = "benchmark password"
+
+
+def _measure(func, seconds: float) -> dict:
+    """ Call `func(i)` for `seconds`, at least once, and return its
+    throughput and latency percentiles
+    """
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while i == 0 or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "ops_per_sec": round(len(latencies) / sum(latencies), 1),
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 1)
+    }
+
+
+def seed(n: int, fmt: str = "json"):
+    """ Write `n` users to `.db_User.json` in the current directory, in
+    the snapshot format `fmt`
+
+    Only the first user has a real password hash, the others get a
+    random hash of the same format, since hashing every password for
+    real would take hours at 1M users.
+    """
+    from models.password import hash_password
+    from models.snapshot import write_snapshot
+
+    created_at = "2024-01-01T00:00:00"
+
+    def objs():
+        for i in range(n):
+            if i == 0:
+                password = hash_password(PASSWORD)
+            else:
+                password = "scrypt$16384$8$1${}${}".format(
+                    base64.b64encode(os.urandom(16)).decode().rstrip("="),
+                    base64.b64encode(os.urandom(32)).decode().rstrip("="))
+            obj_id = "{:08d}-0000-4000-8000-000000000000".format(i)
+            yield obj_id, {
+                "id": obj_id,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "email": "user{}@example.com".format(i),
+                "_password": password,
+                "first_name": "First{}".format(i % 100),
+                "last_name": "Last{}".format(i)
+            }
+
+    write_snapshot(".db_User.json", objs(), fmt)
+
+
+def measure(n: int, seconds: float) -> dict:
+    """ Run every case over the `n` users of the current directory
+    """
+    os.environ["AUTH_TYPE"] = "basic_auth"
+    import api.v1.app as app_module
+    from models.user import User
+
+    start = time.perf_counter()
+    User.load_from_file()
+    load_seconds = time.perf_counter() - start
+    ids = [user.id for user in User.page(limit=min(n, 10000))[0]]
+    user = User.search({"email": EMAIL})[0]
+    rng = random.Random(0)
+
+    def pick(_) -> str:
+        return ids[rng.randrange(len(ids))]
+
+    models = {
+        "load_from_file": {"seconds": round(load_seconds, 3)},
+        "get": _measure(lambda i: User.get(pick(i)), seconds),
+        "search_indexed": _measure(lambda i: User.search(
+            {"email": "user{}@example.com".format(rng.randrange(n))}),
+            seconds),
+        "search_scan": _measure(
+            lambda i: User.search({"first_name": "First7"}), seconds),
+        "count": _measure(lambda i: User.count(), seconds),
+        "page_100": _measure(lambda i: User.page(pick(i), 100), seconds),
+        "save": _measure(lambda i: User.get(pick(i)).save(), seconds),
+        "save_to_file": _measure(lambda i: User.save_to_file(), seconds),
+    }
+    User.flush()
+
+    auth = app_module.auth
+    header = "Basic " + base64.b64encode(
+        "{}:{}".format(EMAIL, PASSWORD).encode()).decode()
+    request = SimpleNamespace(headers={"Authorization": header})
+    assert auth.current_user(request).id == user.id
+    capacity = auth.credential_cache.capacity
+    results_auth = {
+        "current_user_cached": _measure(
+            lambda i: auth.current_user(request), seconds)
+    }
+    auth.credential_cache.capacity = 0
+    results_auth["current_user_uncached"] = _measure(
+        lambda i: auth.current_user(request), seconds)
+    auth.credential_cache.capacity = capacity
+
+    client = app_module.app.test_client()
+    headers = {"Authorization": header}
+
+    def get(path: str):
+        return lambda i: client.get(path.format(id=pick(i)),
+                                    headers=headers)
+
+    api = {
+        "GET /status": _measure(get("/api/v1/status"), seconds),
+        "GET /stats": _measure(get("/api/v1/stats"), seconds),
+        "GET /users/<id>": _measure(get("/api/v1/users/{id}"), seconds),
+        "GET /users?limit=100": _measure(
+            get("/api/v1/users?limit=100"), seconds),
+    }
+    return {
+        "users": n,
+        "models": models,
+        "auth": results_auth,
+        "api": api,
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def main():
+    """ Seed and measure each size in its own directory and process
+    """
+    seconds = float(os.environ.get("BENCHMARK_SECONDS", "1"))
+    if is_child():
+        print(json.dumps(measure(int(sys.argv[1]), seconds)))
+        return
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    results = {
+        "python": sys.version.split()[0],
+        "cores": os.cpu_count(),
+        "storage": os.environ.get("STORAGE_TYPE", "json"),
+        "seconds_per_case": seconds,
+        "sizes": {}
+    }
+    for n in sizes:
+        results["sizes"][str(n)] = run_child(
+            "benchmarks.suite", n,
+            setup="from benchmarks.suite import seed; seed({})".format(n))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
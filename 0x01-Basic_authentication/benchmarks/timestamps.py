@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+""" Micro-benchmark of timestamp parsing and formatting
+
+Compares `strptime`/`strftime` with `parse_timestamp`/`format_timestamp`
+on N random timestamps, checks that both produce identical results and
+reports the time per call in nanoseconds, as JSON. `format_timestamp` is
+measured cold, then cached on as many timestamps as its cache holds.
+
+Usage: python3 -m benchmarks.timestamps [N]
+"""
+from datetime import datetime, timedelta
+import json
+import random
+import sys
+import time
+
+
+def _ns_per_call(func, values) -> float:
+    """ Return the mean time of `func` over `values` in nanoseconds
+    """
+    start = time.perf_counter()
+    for value in values:
+        func(value)
+    return round((time.perf_counter() - start) / len(values) * 1e9, 1)
+
+
+def main():
+    """ Run the benchmark
+    """
+    from models.base import TIMESTAMP_FORMAT, TIMESTAMP_CACHE_SIZE, \
+        format_timestamp, parse_timestamp
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rand = random.Random(0)
+    start = datetime(1000, 1, 1)
+    span = (datetime(9999, 12, 31) - start).total_seconds()
+    dates = [start + timedelta(seconds=rand.randrange(int(span)))
+             for _ in range(n)]
+    strings = [d.strftime(TIMESTAMP_FORMAT) for d in dates]
+
+    for d, s in zip(dates, strings):
+        assert format_timestamp(d) == s, (d, s)
+        assert parse_timestamp(s) == datetime.strptime(s, TIMESTAMP_FORMAT)
+
+    format_timestamp.cache_clear()
+    cached = dates[:TIMESTAMP_CACHE_SIZE]
+    results = {
+        "timestamps": n,
+        "cached_timestamps": len(cached),
+        "identical": True,
+        "strptime_ns": _ns_per_call(
+            lambda s: datetime.strptime(s, TIMESTAMP_FORMAT), strings),
+        "parse_timestamp_ns": _ns_per_call(parse_timestamp, strings),
+        "strftime_ns": _ns_per_call(
+            lambda d: d.strftime(TIMESTAMP_FORMAT), dates),
+        "format_timestamp_cold_ns": _ns_per_call(format_timestamp, dates),
+    }
+    format_timestamp.cache_clear()
+    for d in cached:
+        format_timestamp(d)
+    if cached:
+        results["format_timestamp_cached_ns"] = _ns_per_call(
+            format_timestamp, cached)
+    results["cache_misses"] = format_timestamp.cache_info().misses - \
+        len(cached)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
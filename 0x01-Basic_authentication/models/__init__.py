@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+""" Models package
+
+`storage` is the engine `Base` routes every load, save and query
+through, selected by the environment variable STORAGE_TYPE: "json"
+(default) or "sqlite". `use_storage()` selects another one.
+"""
+from os import getenv
+from models.engine.json_storage import JSONStorage
+
+
+storage = None
+
+
+def use_storage(storage_type: str):
+    """ Select the storage engine: "json" (default) or "sqlite"
+    """
+    global storage
+    if storage_type == "sqlite":
+        from models.engine.sqlite_storage import SQLiteStorage
+        storage = SQLiteStorage(getenv("MODELS_SQLITE_PATH", ".db.sqlite3"))
+    elif storage_type == "json":
+        storage = JSONStorage()
+    else:
+        raise ValueError("Unknown storage type: {}".format(storage_type))
+
+
+use_storage(getenv("STORAGE_TYPE", "json"))
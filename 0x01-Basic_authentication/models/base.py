@@ -2,36 +2,69 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
-import json
+from functools import lru_cache
+from typing import TypeVar, List, Iterable, Iterator, Optional, Tuple
+from os import getenv
+from models import stats
+from models.query import Query
+import models
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+# Bound of the datetime -> formatted string LRU cache used by to_json()
+TIMESTAMP_CACHE_SIZE = int(getenv("MODELS_TIMESTAMP_CACHE_SIZE", "65536"))
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string
+
+    `fromisoformat` is used for strings of exactly that shape, which is
+    much faster than `strptime`; anything else goes through `strptime`
+    so that invalid values are rejected the same way.
+    """
+    if len(value) == 19 and value[4] == value[7] == '-' and \
+            value[10] == 'T' and value[13] == value[16] == ':':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def format_timestamp(value: datetime) -> str:
+    """ Format a datetime with TIMESTAMP_FORMAT
+
+    Results are kept in an LRU cache of TIMESTAMP_CACHE_SIZE values: a
+    changed `updated_at` is a new key, and the least recently formatted
+    values are evicted first.
+    """
+    if value.year < 1000:
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value.isoformat(timespec='seconds')
 
 
 class Base():
     """ Base class
+
+    Objects are stored through `models.storage`. Subclasses can list
+    attributes in `_indexed_attributes` to get them indexed by it for
+    equality, and in `_sorted_attributes` for ranges and ordering.
     """
+    _indexed_attributes = ()
+    _sorted_attributes = ()
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -52,61 +85,76 @@ class Base():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+                result[key] = format_timestamp(value)
             else:
                 result[key] = value
         return result
 
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
-        """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+    def load_from_file(cls) -> dict:
+        """ Load all objects from storage
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        Return the number of objects loaded and the load duration, or
+        {"loading": True} if they are loaded in the background.
+        """
+        load_stats = models.storage.load(cls)
+        if load_stats.get("loading"):
+            # Seeded again before the first change or count, which wait
+            # for the load, see `stats.ensure()`
+            stats.forget(cls)
+        else:
+            stats.seed(cls, load_stats["count"])
+        return load_stats
 
     @classmethod
     def save_to_file(cls):
-        """ Save all objects to file
+        """ Save all objects to storage
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        models.storage.save_all(cls)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def flush(cls):
+        """ Write every pending change to storage now
+        """
+        models.storage.flush()
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        stats.ensure(self.__class__)
+        if models.storage.save(self):
+            stats.created(self.__class__, [self])
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        stats.ensure(self.__class__)
+        if models.storage.remove(self):
+            stats.removed(self.__class__, [self])
+
+    @classmethod
+    def save_many(cls, objs: List[TypeVar('Base')]):
+        """ Save several objects, persisted at once
+        """
+        now = datetime.utcnow()
+        for obj in objs:
+            obj.updated_at = now
+        stats.ensure(cls)
+        stats.created(cls, models.storage.save_many(cls, objs))
+
+    @classmethod
+    def remove_many(cls, objs: List[TypeVar('Base')]):
+        """ Remove several objects, persisted at once
+        """
+        stats.ensure(cls)
+        stats.removed(cls, models.storage.remove_many(cls, objs))
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return models.storage.count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,20 +166,53 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return models.storage.get(cls, id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+    def page(cls, after: str = None, limit: int = 100,
+             attributes: dict = None
+             ) -> Tuple[List[TypeVar('Base')], Optional[str]]:
+        """ Return up to `limit` objects in id order, starting after the
+        id `after`, and the id to start the next page after (None on
+        the last page)
+
+        With `attributes`, only the objects matching them, as for
+        `search()`.
+        """
+        if attributes:
+            if after is not None:
+                attributes = dict(attributes, id__gt=after)
+            objs = cls.search(attributes, "id", limit + 1)
+        else:
+            objs = models.storage.page(cls, after, limit + 1)
+        if len(objs) <= limit:
+            return objs, None
+        objs = objs[:limit]
+        return objs, objs[-1].id
+
+    @classmethod
+    def iter_all(cls, batch_size: int = 500) -> Iterator[TypeVar('Base')]:
+        """ Yield all objects in id order, `batch_size` at a time
+
+        Only one batch is held in memory, and objects saved or removed
+        meanwhile do not break the iteration.
+        """
+        after = None
+        while True:
+            objs = models.storage.page(cls, after, batch_size)
+            yield from objs
+            if len(objs) < batch_size:
+                return
+            after = objs[-1].id
+
+    @classmethod
+    def search(cls, attributes: dict = None, order_by: str = None,
+               limit: int = None) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Keys of `attributes` can end with an operator, e.g.
+        `email__startswith` or `created_at__gte`, see `models.query`.
+        `order_by` is an attribute, prefixed with '-' for a descending
+        order. ValueError if an operator is unknown.
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return models.storage.search(cls, Query(attributes, order_by, limit))
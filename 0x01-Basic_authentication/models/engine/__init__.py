@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+""" Storage engines of the models
+
+Every engine implements the same interface, used by `Base`:
+load, save_all, flush, save, save_many, remove, remove_many, count,
+get, page, search, created_since and load_progress.
+
+`save` and `remove` return whether the object was new or stored, and
+`save_many` and `remove_many` return the objects that were, so that
+`models.stats` can maintain its counters. An engine whose
+`shares_counters` is True maintains them itself and returns them from
+`counters`. `search` takes a `models.query.Query`, which engines plan
+with their own indexes.
+"""
@@ -0,0 +1,672 @@
+#!/usr/bin/env python3
+""" JSON storage module
+
+Default storage backend: objects live in the module-level `DATA` dict
+of each process and are persisted to `.db_<Class>.json` files.
+
+Each class has a readers-writer lock: queries share it and return
+lists built under it, while changes to memory, the indexes and the
+journal hold it alone. Writing a class file is serialized by a second
+per-class lock, so that one writer at a time snapshots and replaces it.
+"""
+from datetime import datetime
+from typing import TypeVar, List, Iterable, Iterator, Optional, Tuple
+from os import getenv
+import bisect
+from models.journal import Journal
+from models.query import Condition, Query
+from models.rwlock import RWLock
+from models.snapshot import index_snapshot, read_line, read_snapshot, \
+    write_snapshot
+from models.writer import Writer
+import threading
+import time
+
+
+# "file" rewrites the whole file on each change, "journal" appends to a
+# write-ahead log that is compacted into the file every N records
+STORAGE_MODE = getenv("MODELS_STORAGE_MODE", "file")
+JOURNAL_COMPACT_THRESHOLD = int(
+    getenv("MODELS_JOURNAL_COMPACT_THRESHOLD", "1000"))
+JOURNAL_FSYNC = getenv("MODELS_JOURNAL_FSYNC", "0") == "1"
+# 0 writes files synchronously; otherwise changes are coalesced and
+# written by a background thread at most every N milliseconds
+FLUSH_INTERVAL_MS = int(getenv("MODELS_FLUSH_INTERVAL_MS", "0"))
+# Format of written files, "json" or "ndjson"; both are always readable
+SNAPSHOT_FORMAT = getenv("MODELS_SNAPSHOT_FORMAT", "json")
+# "eager" loads a class before `load()` returns, "background" in a thread
+LOAD_MODE = getenv("MODELS_LOAD_MODE", "eager")
+DATA = {}
+# Class name -> {"count": objects loaded, "seconds": load duration}
+LOAD_STATS = {}
+JOURNALS = {}
+# Class name -> LoadState of its last background load
+LOADS = {}
+WRITER = Writer(FLUSH_INTERVAL_MS)
+# Secondary hash indexes: class name -> attribute -> value -> bucket,
+# where a bucket is the id of the only matching object or {id: None}
+INDEXES = {}
+# Indexed values of each stored object, used to un-index stale entries
+INDEXED_VALUES = {}
+# Sorted indexes: class name -> attribute -> value family -> parallel
+# lists (keys, ids) sorted by key then id, keys of one family being
+# comparable, see `value_family()`
+SORTED_INDEXES = {}
+# Changes of more objects at once rebuild the sorted indexes instead of
+# inserting into them one at a time
+SORTED_BULK_SIZE = 1000
+# Class name -> sorted list of ids, for pagination
+ORDERED_IDS = {}
+# Class name -> RWLock over its objects, and lock serializing its writes
+LOCKS = {}
+FILE_LOCKS = {}
+LOCKS_LOCK = threading.Lock()
+
+
+def class_lock(cls: type) -> RWLock:
+    """ Return the readers-writer lock of `cls`
+    """
+    lock = LOCKS.get(cls.__name__)
+    if lock is None:
+        with LOCKS_LOCK:
+            lock = LOCKS.setdefault(cls.__name__, RWLock())
+            FILE_LOCKS.setdefault(cls.__name__, threading.Lock())
+    return lock
+
+
+class LoadState():
+    """ Progress of the background load of a class
+    """
+
+    def __init__(self):
+        """ Initialize the state of a load starting now
+        """
+        self.start = time.monotonic()
+        self.loaded = 0
+        # Objects in the file, known once an ndjson file is indexed
+        self.total = None
+        # id -> offset of its line in an ndjson file, None if legacy
+        self.offsets = None
+        # id -> last journal record of the object
+        self.overlay = {}
+        self.error = None
+        self.indexed = threading.Event()
+        self.done = threading.Event()
+
+
+def value_family(value) -> Optional[type]:
+    """ Family of a value in the sorted indexes, None if not sortable
+    """
+    if type(value) in (str, datetime):
+        return type(value)
+    if type(value) in (int, float):
+        return float
+    return None
+
+
+def entry_position(entries: Tuple[list, list], key, obj_id: str) -> int:
+    """ Position of (`key`, `obj_id`) in the parallel (keys, ids) lists
+    of a sorted index, ordered by key then id
+    """
+    keys, ids = entries
+    lo = bisect.bisect_left(keys, key)
+    hi = bisect.bisect_right(keys, key, lo)
+    return bisect.bisect_left(ids, obj_id, lo, hi)
+
+
+def _range(items: list, start: int, end: int,
+           reverse: bool) -> Iterator[str]:
+    """ Iterate over `items[start:end]`, in reverse order if `reverse`,
+    without copying the list
+    """
+    positions = range(start, end)
+    for i in reversed(positions) if reverse else positions:
+        yield items[i]
+
+
+class JSONStorage():
+    """ In-process storage persisted to one JSON file per class
+
+    Classes can list attributes in `_indexed_attributes` to get a hash
+    index for equality lookups, and in `_sorted_attributes` to get a
+    sorted index for ranges, prefixes and ordering. `search()` plans
+    each query with the index giving the fewest candidates.
+    """
+    # Counters are kept by `models.stats` in this process
+    shares_counters = False
+
+    def load(self, cls: type) -> dict:
+        """ Load all objects from file, then replay the journal
+
+        Objects are parsed and created one at a time. Return the number
+        of objects loaded and the load duration, also kept in LOAD_STATS.
+
+        In background LOAD_MODE, return {"loading": True} as soon as a
+        thread holds the class alone to load it: queries and changes
+        wait for it, except `get()`, see `_fault_in()`.
+        """
+        if LOAD_MODE != "background":
+            with class_lock(cls).write():
+                LOADS.pop(cls.__name__, None)
+                return self._load(cls)
+        state = LoadState()
+        LOADS[cls.__name__] = state
+        locked = threading.Event()
+        threading.Thread(target=self._load_in_background,
+                         args=(cls, state, locked),
+                         name="models-load-{}".format(cls.__name__),
+                         daemon=True).start()
+        locked.wait()
+        return {"loading": True}
+
+    def _load(self, cls: type, state: 'LoadState' = None) -> dict:
+        """ Load all objects of `cls`, which must be held alone,
+        counting them in `state`
+        """
+        start = time.monotonic() if state is None else state.start
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        DATA[s_class] = {}
+        self._reset_indexes(cls)
+        for obj_json in read_snapshot(file_path):
+            obj = cls(**obj_json)
+            DATA[s_class][obj.id] = obj
+            self._index_add(obj, False)
+            if state is not None:
+                state.loaded += 1
+        self._rebuild_sorted(cls)
+
+        for record in self._journal(cls).replay():
+            obj = DATA[s_class].pop(record["id"], None)
+            if obj is not None:
+                self._index_remove(obj)
+            if record["op"] == "save":
+                obj = cls(**record["obj"])
+                DATA[s_class][obj.id] = obj
+                self._index_add(obj)
+        ORDERED_IDS[s_class] = sorted(DATA[s_class])
+
+        LOAD_STATS[s_class] = {
+            "count": len(DATA[s_class]),
+            "seconds": time.monotonic() - start
+        }
+        return LOAD_STATS[s_class]
+
+    def _load_in_background(self, cls: type, state: 'LoadState',
+                            locked: threading.Event):
+        """ Hold `cls` alone, index its file for `_fault_in()`, then
+        load it
+        """
+        lock = class_lock(cls)
+        lock.acquire_write()
+        locked.set()
+        try:
+            s_class = cls.__name__
+            try:
+                state.offsets = index_snapshot(".db_{}.json".format(s_class))
+                if state.offsets is not None:
+                    state.total = len(state.offsets)
+                    for record in self._journal(cls).replay():
+                        state.overlay[record["id"]] = record
+            except Exception:
+                # `get()` waits for the load instead
+                state.offsets = None
+                state.overlay = {}
+            finally:
+                state.indexed.set()
+            self._load(cls, state)
+        except Exception as e:
+            # The class is only partly in memory: keep it read-only, so
+            # that it is never written over its file and journal
+            state.error = repr(e)
+        finally:
+            lock.release_write()
+            state.done.set()
+
+    def _fault_in(self, cls: type, id: str,
+                  state: 'LoadState') -> TypeVar('Base'):
+        """ Return one object of `cls` by ID while it is being loaded
+
+        The object is read alone from its line of an ndjson file, or
+        from the journal if it changed since; for a legacy file, wait
+        for the load to complete.
+        """
+        state.indexed.wait()
+        if state.offsets is None or state.done.is_set():
+            state.done.wait()
+            return self.get(cls, id)
+        if id in state.overlay:
+            record = state.overlay[id]
+            return cls(**record["obj"]) if record["op"] == "save" else None
+        offset = state.offsets.get(id)
+        if offset is None:
+            return None
+        obj_json = read_line(".db_{}.json".format(cls.__name__), offset)
+        if obj_json.get("id") != id:
+            # The file was rewritten once loaded
+            return self.get(cls, id)
+        return cls(**obj_json)
+
+    def _check_writable(self, cls: type):
+        """ Raise RuntimeError if the background load of `cls` failed
+        """
+        state = LOADS.get(cls.__name__)
+        if state is not None and state.error is not None:
+            raise RuntimeError("{} failed to load, it is read-only: {}"
+                               .format(cls.__name__, state.error))
+
+    def load_progress(self) -> dict:
+        """ Return the progress of each class still loading, or whose
+        background load failed
+        """
+        progress = {}
+        for s_class, state in list(LOADS.items()):
+            if state.done.is_set() and state.error is None:
+                continue
+            progress[s_class] = {
+                "loaded": state.loaded,
+                "total": state.total,
+                "progress": round(state.loaded / state.total, 3)
+                if state.total else None,
+                "seconds": round(time.monotonic() - state.start, 3)
+            }
+            if state.error is not None:
+                progress[s_class]["error"] = state.error
+        return progress
+
+    def save_all(self, cls: type):
+        """ Save all objects to file
+
+        Objects are serialized one at a time and the file is replaced
+        atomically. It becomes the new snapshot, so the journal is
+        emptied: in journal mode, changes wait until then, so that none
+        is appended between the snapshot and the truncation.
+        """
+        self._check_writable(cls)
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        lock = class_lock(cls)
+        with FILE_LOCKS[s_class]:
+            lock.acquire_read()
+            try:
+                items = list(DATA.get(s_class, {}).items())
+                if STORAGE_MODE != "journal":
+                    lock.release_read()
+                    lock = None
+                objs = ((obj_id, obj.to_json(True))
+                        for obj_id, obj in items)
+                write_snapshot(file_path, objs, SNAPSHOT_FORMAT)
+                self._journal(cls).truncate()
+            finally:
+                if lock is not None:
+                    lock.release_read()
+
+    def flush(self):
+        """ Write every pending change to file now
+        """
+        WRITER.flush()
+
+    def _journal(self, cls: type) -> Journal:
+        """ Return the write-ahead log of `cls`
+        """
+        s_class = cls.__name__
+        if JOURNALS.get(s_class) is None:
+            file_path = ".db_{}.log".format(s_class)
+            JOURNALS[s_class] = Journal(file_path, JOURNAL_FSYNC)
+        return JOURNALS[s_class]
+
+    def _log(self, cls: type, changes: List[tuple]):
+        """ Append a list of (op, obj) changes of `cls` to its journal
+        in journal mode, while the change is held alone
+        """
+        if STORAGE_MODE == "journal" and changes:
+            self._journal(cls).append_many(
+                (op, obj.id, obj.to_json(True) if op == "save" else None)
+                for op, obj in changes)
+
+    def _persist(self, cls: type):
+        """ Persist the changes of `cls` according to STORAGE_MODE
+        """
+        if STORAGE_MODE == "journal":
+            if self._journal(cls).records >= JOURNAL_COMPACT_THRESHOLD:
+                self.save_all(cls)
+        elif FLUSH_INTERVAL_MS > 0:
+            WRITER.mark_dirty(cls)
+        else:
+            self.save_all(cls)
+
+    def _store(self, obj: TypeVar('Base'), sort: bool = True) -> bool:
+        """ Store `obj` in memory and index it, return True if it is a
+        new object
+        """
+        s_class = obj.__class__.__name__
+        objs = DATA.setdefault(s_class, {})
+        is_new = obj.id not in objs
+        if is_new:
+            bisect.insort(ORDERED_IDS.setdefault(s_class, []), obj.id)
+        objs[obj.id] = obj
+        self._index_add(obj, sort)
+        return is_new
+
+    def _discard(self, obj: TypeVar('Base'), sort: bool = True) -> bool:
+        """ Remove `obj` from memory and the indexes, return False if
+        it was not stored
+        """
+        s_class = obj.__class__.__name__
+        if DATA.get(s_class, {}).get(obj.id) is None:
+            return False
+        del DATA[s_class][obj.id]
+        ids = ORDERED_IDS.get(s_class, [])
+        i = bisect.bisect_left(ids, obj.id)
+        if i < len(ids) and ids[i] == obj.id:
+            del ids[i]
+        self._index_remove(obj, sort)
+        return True
+
+    def save(self, obj: TypeVar('Base')) -> bool:
+        """ Store `obj` and persist it, return True if it is new
+        """
+        with class_lock(obj.__class__).write():
+            self._check_writable(obj.__class__)
+            is_new = self._store(obj)
+            self._log(obj.__class__, [("save", obj)])
+        self._persist(obj.__class__)
+        return is_new
+
+    def save_many(self, cls: type,
+                  objs: List[TypeVar('Base')]) -> List[TypeVar('Base')]:
+        """ Store every object of `objs` and persist them at once,
+        return the new ones
+        """
+        sort = len(objs) <= SORTED_BULK_SIZE
+        with class_lock(cls).write():
+            self._check_writable(cls)
+            created = [obj for obj in objs if self._store(obj, sort)]
+            if not sort:
+                self._rebuild_sorted(cls)
+            self._log(cls, [("save", obj) for obj in objs])
+        if objs:
+            self._persist(cls)
+        return created
+
+    def remove(self, obj: TypeVar('Base')) -> bool:
+        """ Remove `obj` and persist the removal, return True if it was
+        stored
+        """
+        with class_lock(obj.__class__).write():
+            self._check_writable(obj.__class__)
+            if not self._discard(obj):
+                return False
+            self._log(obj.__class__, [("remove", obj)])
+        self._persist(obj.__class__)
+        return True
+
+    def remove_many(self, cls: type,
+                    objs: List[TypeVar('Base')]) -> List[TypeVar('Base')]:
+        """ Remove every object of `objs` and persist them at once,
+        return the ones that were stored
+        """
+        sort = len(objs) <= SORTED_BULK_SIZE
+        with class_lock(cls).write():
+            self._check_writable(cls)
+            removed = [obj for obj in objs if self._discard(obj, sort)]
+            if not sort:
+                self._rebuild_sorted(cls)
+            self._log(cls, [("remove", obj) for obj in removed])
+        if removed:
+            self._persist(cls)
+        return removed
+
+    def created_since(self, cls: type, since: datetime) -> List[datetime]:
+        """ Return the creation date of the objects of `cls` created
+        since `since`
+        """
+        with class_lock(cls).read():
+            return [obj.created_at
+                    for obj in DATA.get(cls.__name__, {}).values()
+                    if obj.created_at >= since]
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of `cls`
+        """
+        with class_lock(cls).read():
+            return len(DATA.get(cls.__name__, {}))
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of `cls` by ID
+        """
+        state = LOADS.get(cls.__name__)
+        if state is not None and not state.done.is_set():
+            return self._fault_in(cls, id, state)
+        with class_lock(cls).read():
+            return DATA.get(cls.__name__, {}).get(id)
+
+    def page(self, cls: type, after: str = None,
+             limit: int = 100) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects of `cls` in id order, starting
+        after the id `after`
+        """
+        s_class = cls.__name__
+        with class_lock(cls).read():
+            ids = ORDERED_IDS.get(s_class, [])
+            start = 0 if after is None else bisect.bisect_right(ids, after)
+            objs = DATA[s_class] if ids else {}
+            return [objs[obj_id] for obj_id in ids[start:start + limit]]
+
+    def search(self, cls: type, query: Query) -> List[TypeVar('Base')]:
+        """ Return the objects of `cls` matching `query`
+
+        The candidates come from the index that gives the fewest for
+        one condition: hash index or id for equality and `in`, sorted
+        index or id order for ranges and prefixes, or every object.
+        Only they are checked against all conditions. When they come
+        in the requested order, the check stops at the limit.
+        """
+        with class_lock(cls).read():
+            objs = DATA.get(cls.__name__, {})
+            ids, order = self._plan(cls, query)
+            candidates = objs.values() if ids is None else \
+                (objs[obj_id] for obj_id in ids)
+            if order is None or order != query.order_by:
+                return query.finish(obj for obj in candidates
+                                    if query.matches(obj))
+            found = []
+            for obj in candidates:
+                if query.limit is not None and len(found) >= query.limit:
+                    break
+                if query.matches(obj):
+                    found.append(obj)
+            return found
+
+    def _plan(self, cls: type,
+              query: Query) -> Tuple[Optional[Iterable[str]], Optional[str]]:
+        """ Return the candidate ids of the cheapest plan of `query`, or
+        None for every object, and the attribute they are ordered by
+
+        Ids ordered by the attribute of `query.order_by` come in its
+        direction.
+        """
+        s_class = cls.__name__
+        objs = DATA.get(s_class, {})
+        best = (len(objs), None, None)
+        for condition in query.conditions:
+            reverse = query.descending and query.order_by == condition.attr
+            plan = self._condition_plan(cls, condition, reverse)
+            if plan is not None and plan[0] < best[0]:
+                best = plan
+        if best[1] is None and query.order_by is not None and \
+                query.limit is not None:
+            # No selective index: walk the order index to stop early
+            ids = self._ordered_ids(s_class, query.order_by,
+                                    query.descending)
+            if ids is not None:
+                best = (best[0], ids, query.order_by)
+        return best[1], best[2]
+
+    def _condition_plan(self, cls: type, condition: Condition,
+                        reverse: bool = False
+                        ) -> Optional[Tuple[int, Iterable[str], str]]:
+        """ Return (candidate count, candidate ids, order attribute)
+        through an index for one condition, or None
+
+        Ids ordered by the attribute come in reverse order if `reverse`.
+        """
+        s_class = cls.__name__
+        attr, op, value = condition.attr, condition.op, condition.value
+        values = value if op == "in" else (value,)
+        if attr == "id" and op in ("eq", "in"):
+            objs = DATA.get(s_class, {})
+            ids = list(dict.fromkeys(
+                v for v in values if type(v) is str and v in objs))
+            return len(ids), ids, None
+        index = INDEXES.get(s_class, {}).get(attr)
+        if index is not None and op in ("eq", "in"):
+            ids = {}
+            for v in values:
+                try:
+                    bucket = index.get(v, ())
+                except TypeError:
+                    return None
+                ids.update(dict.fromkeys((bucket,) if type(bucket) is str
+                                         else bucket))
+            return len(ids), list(ids), None
+        bounds = condition.bounds()
+        family = value_family(value)
+        if bounds is None or family is None:
+            return None
+        low, low_inclusive, high, high_inclusive = bounds
+        if attr == "id":
+            if family is not str:
+                return None
+            ids = ORDERED_IDS.get(s_class, [])
+            start = 0 if low is None else (
+                bisect.bisect_left if low_inclusive
+                else bisect.bisect_right)(ids, low)
+            end = len(ids) if high is None else (
+                bisect.bisect_right if high_inclusive
+                else bisect.bisect_left)(ids, high)
+            return end - start, _range(ids, start, end, reverse), attr
+        if attr not in SORTED_INDEXES.get(s_class, {}):
+            return None
+        family = value_family(value)
+        keys, ids = SORTED_INDEXES[s_class][attr].get(family, ([], []))
+        start = 0 if low is None else (
+            bisect.bisect_right if not low_inclusive
+            else bisect.bisect_left)(keys, low)
+        end = len(keys) if high is None else (
+            bisect.bisect_right if high_inclusive
+            else bisect.bisect_left)(keys, high)
+        return end - start, _range(ids, start, end, reverse), attr
+
+    def _ordered_ids(self, s_class: str, attr: str,
+                     reverse: bool) -> Optional[Iterable[str]]:
+        """ Return every id in the order of `attr`, if one index holds
+        them all
+        """
+        if attr == "id":
+            ids = ORDERED_IDS.get(s_class, [])
+            return _range(ids, 0, len(ids), reverse)
+        families = SORTED_INDEXES.get(s_class, {}).get(attr, {})
+        if len(families) != 1:
+            return None
+        ids = next(iter(families.values()))[1]
+        if len(ids) != len(DATA.get(s_class, {})):
+            return None
+        return _range(ids, 0, len(ids), reverse)
+
+    def _reset_indexes(self, cls: type):
+        """ Drop and re-create the empty indexes of `cls`
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {attr: {} for attr in cls._indexed_attributes}
+        SORTED_INDEXES[s_class] = {attr: {}
+                                   for attr in cls._sorted_attributes}
+        INDEXED_VALUES[s_class] = {}
+
+    def _index_add(self, obj: TypeVar('Base'), sort: bool = True):
+        """ Index `obj`, replacing its previous entries
+
+        Unless `sort`, the sorted indexes are left for
+        `_rebuild_sorted()`.
+        """
+        s_class = obj.__class__.__name__
+        if s_class not in INDEXES:
+            self._reset_indexes(obj.__class__)
+        self._index_remove(obj, sort)
+        values = []
+        for attr, index in INDEXES[s_class].items():
+            value = getattr(obj, attr, None)
+            try:
+                bucket = index.get(value)
+                if bucket is None:
+                    index[value] = obj.id
+                elif type(bucket) is str:
+                    index[value] = {bucket: None, obj.id: None}
+                else:
+                    bucket[obj.id] = None
+            except TypeError:
+                value = None
+            values.append(value)
+        for attr, families in SORTED_INDEXES[s_class].items():
+            value = getattr(obj, attr, None)
+            family = value_family(value)
+            if family is None:
+                value = None
+            elif sort:
+                entries = families.setdefault(family, ([], []))
+                i = entry_position(entries, value, obj.id)
+                entries[0].insert(i, value)
+                entries[1].insert(i, obj.id)
+            values.append(value)
+        INDEXED_VALUES[s_class][obj.id] = tuple(values)
+
+    def _index_remove(self, obj: TypeVar('Base'), sort: bool = True):
+        """ Remove `obj` from the indexes
+        """
+        s_class = obj.__class__.__name__
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj.id, None)
+        if values is None:
+            return
+        for attr, value in zip(INDEXES[s_class], values):
+            index = INDEXES[s_class][attr]
+            bucket = index.get(value)
+            if bucket is None:
+                continue
+            if type(bucket) is str:
+                if bucket == obj.id:
+                    del index[value]
+                continue
+            bucket.pop(obj.id, None)
+            if len(bucket) == 1:
+                index[value] = next(iter(bucket))
+        if not sort:
+            return
+        sorted_values = values[len(INDEXES[s_class]):]
+        for attr, value in zip(SORTED_INDEXES[s_class], sorted_values):
+            if value is None:
+                continue
+            keys, ids = SORTED_INDEXES[s_class][attr][value_family(value)]
+            i = entry_position((keys, ids), value, obj.id)
+            if i < len(ids) and ids[i] == obj.id:
+                del keys[i]
+                del ids[i]
+
+    def _rebuild_sorted(self, cls: type):
+        """ Rebuild the sorted indexes of `cls` from the indexed values
+        """
+        s_class = cls.__name__
+        if s_class not in INDEXES:
+            self._reset_indexes(cls)
+        offset = len(INDEXES[s_class])
+        for i, attr in enumerate(SORTED_INDEXES[s_class]):
+            families = {}
+            for obj_id, values in INDEXED_VALUES[s_class].items():
+                value = values[offset + i]
+                if value is not None:
+                    families.setdefault(value_family(value), []).append(
+                        (value, obj_id))
+            for family, entries in families.items():
+                entries.sort()
+                families[family] = ([key for key, _ in entries],
+                                    [obj_id for _, obj_id in entries])
+            SORTED_INDEXES[s_class][attr] = families
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+""" SQLite storage module
+
+Storage backend sharing one SQLite database between processes: each
+class has a table holding the JSON of its objects, plus one indexed
+column per attribute of `_indexed_attributes` and `_sorted_attributes`.
+
+Objects read by `get()` are kept in a per-process LRU cache. Every
+change also appends the class and id of the object to the `_changes`
+table, in the same transaction; when `PRAGMA data_version` shows that
+another connection committed, the new rows of `_changes` are read and
+only the objects they name are dropped from the cache.
+
+The counters read by `models.stats` are shared too: the number of
+objects of each class and their creations per minute over the last day
+are kept in the `_counts` and `_created` tables, updated in the same
+transaction as each change, so every process reports the changes of
+all of them.
+"""
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, TypeVar, List, Optional, Tuple
+from os import getenv, path
+from models.query import Condition, Query
+from models.snapshot import read_snapshot
+import json
+import sqlite3
+import threading
+import time
+
+
+# Objects kept by each process, 0 disables the cache
+CACHE_SIZE = int(getenv("MODELS_SQLITE_CACHE_SIZE", "10000"))
+# Rows kept in `_changes`; a process further behind clears its cache
+CHANGE_LOG_SIZE = int(getenv("MODELS_SQLITE_CHANGE_LOG_SIZE", "10000"))
+
+
+class SQLiteStorage():
+    """ Storage of the objects in a SQLite database in WAL mode
+    """
+    # Counters are kept in the database, see `counters()`
+    shares_counters = True
+
+    def __init__(self, file_path: str):
+        """ Initialize a SQLiteStorage over the database `file_path`
+        """
+        self.file_path = file_path
+        self._local = threading.local()
+        self._tables = set()
+        # (class name, id) -> object, in least recently used order
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Last `_changes` row applied to the cache
+        self._seq = None
+        # Incremented on each change made by this process, so that an
+        # object read before it is not cached after it
+        self._version = 0
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.file_path, timeout=30,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS _changes "
+                         "(seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "class TEXT NOT NULL, id TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS _counts "
+                         "(class TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS _created "
+                         "(class TEXT NOT NULL, minute INTEGER NOT NULL, "
+                         "count INTEGER NOT NULL, "
+                         "PRIMARY KEY (class, minute))")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _columns(cls: type) -> Tuple[str, ...]:
+        """ Indexed columns of the table of `cls`, besides id
+        """
+        return tuple(dict.fromkeys(cls._indexed_attributes +
+                                   cls._sorted_attributes))
+
+    def _table(self, cls: type) -> str:
+        """ Create the table of `cls` if needed and return its name
+
+        Indexed columns missing from an existing table are added and
+        filled from the JSON of the objects, and the objects of a table
+        not counted yet are counted.
+        """
+        s_class = cls.__name__
+        if s_class not in self._tables:
+            columns = self._columns(cls)
+            conn = self._connection
+            conn.execute('CREATE TABLE IF NOT EXISTS "{}" '
+                         '(id TEXT PRIMARY KEY, data TEXT NOT NULL{})'
+                         .format(s_class, "".join(', "{}"'.format(attr)
+                                                  for attr in columns)))
+            existing = {row[1] for row in conn.execute(
+                'PRAGMA table_info("{}")'.format(s_class))}
+            for attr in columns:
+                if attr not in existing:
+                    conn.execute('ALTER TABLE "{}" ADD COLUMN "{}"'
+                                 .format(s_class, attr))
+                    conn.execute('UPDATE "{0}" SET "{1}" = json_extract('
+                                 'data, ?)'.format(s_class, attr),
+                                 ("$." + attr,))
+                conn.execute('CREATE INDEX IF NOT EXISTS "idx_{0}_{1}" '
+                             'ON "{0}" ("{1}")'.format(s_class, attr))
+            if conn.execute("SELECT 1 FROM _counts WHERE class = ?",
+                            (s_class,)).fetchone() is None:
+                self._transaction(self._seed_counters, s_class)
+            self._tables.add(s_class)
+        return s_class
+
+    def load(self, cls: type) -> dict:
+        """ Create the table of `cls`, importing `.db_<Class>.json`
+        into it if the table is empty
+        """
+        start = time.monotonic()
+        table = self._table(cls)
+        file_path = ".db_{}.json".format(cls.__name__)
+        count = self.count(cls)
+        if count == 0 and path.exists(file_path):
+            self._transaction(self._import, table, cls, file_path)
+            count = self.count(cls)
+        return {"count": count, "seconds": time.monotonic() - start}
+
+    def _import(self, table: str, cls: type, file_path: str):
+        """ Insert the objects of a JSON file, 1000 rows at a time
+        """
+        batch = []
+        for obj_json in read_snapshot(file_path):
+            batch.append(cls(**obj_json))
+            if len(batch) == 1000:
+                self._upsert(table, batch)
+                batch = []
+        self._upsert(table, batch)
+
+    def load_progress(self) -> dict:
+        """ Nothing is loaded in the background
+        """
+        return {}
+
+    def save_all(self, cls: type):
+        """ Nothing to do: every change is committed when made
+        """
+        self._table(cls)
+
+    def flush(self):
+        """ Nothing to do: every change is committed when made
+        """
+
+    def _upsert(self, table: str,
+                objs: List[TypeVar('Base')]) -> List[TypeVar('Base')]:
+        """ Insert or update the rows of `objs`, return the objects
+        that were inserted
+        """
+        if not objs:
+            return []
+        attrs = self._columns(objs[0].__class__)
+        columns = "".join(', "{}"'.format(attr) for attr in attrs)
+        params = ", ".join("?" * (len(attrs) + 2))
+        assignments = "".join(', "{}" = ?'.format(attr) for attr in attrs)
+        insert = 'INSERT OR IGNORE INTO "{}" (id, data{}) VALUES ({})' \
+            .format(table, columns, params)
+        update = 'UPDATE "{}" SET data = ?{} WHERE id = ?' \
+            .format(table, assignments)
+        conn = self._connection
+        created = []
+        for obj in objs:
+            obj_json = obj.to_json(True)
+            data = json.dumps(obj_json)
+            values = [obj_json.get(attr) for attr in attrs]
+            if conn.execute(insert, [obj.id, data] + values).rowcount:
+                created.append(obj)
+            else:
+                conn.execute(update, [data] + values + [obj.id])
+        self._log_changes(table, objs)
+        self._count(table, created, 1)
+        return created
+
+    def _seed_counters(self, table: str):
+        """ Count the objects of `table` in `_counts` and `_created`,
+        unless another process just did
+        """
+        from models.stats import WINDOW
+
+        conn = self._connection
+        if conn.execute("SELECT 1 FROM _counts WHERE class = ?",
+                        (table,)).fetchone() is not None:
+            return
+        conn.execute('INSERT INTO _counts (class, count) '
+                     'SELECT ?, COUNT(*) FROM "{}"'.format(table), (table,))
+        conn.execute("DELETE FROM _created WHERE class = ?", (table,))
+        self._count_created(table, self._created_since(
+            table, datetime.utcnow() - WINDOW), 1)
+
+    def _count(self, table: str, objs: List[TypeVar('Base')], step: int):
+        """ Add `step` to the counters of `table` for each of `objs`
+        """
+        if not objs:
+            return
+        self._connection.execute(
+            "UPDATE _counts SET count = count + ? WHERE class = ?",
+            (step * len(objs), table))
+        self._count_created(table, [obj.created_at for obj in objs], step)
+
+    def _count_created(self, table: str, dates: Iterable[datetime],
+                       step: int):
+        """ Add `step` to the creations of `table` in the minute of
+        each date of the last day, and drop the older minutes
+        """
+        from models.stats import WINDOW, to_minute
+
+        now = to_minute(datetime.utcnow())
+        oldest = now - int(WINDOW.total_seconds()) // 60
+        minutes = Counter(to_minute(date) for date in dates)
+        conn = self._connection
+        conn.executemany(
+            "INSERT INTO _created (class, minute, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (class, minute) "
+            "DO UPDATE SET count = count + excluded.count",
+            [(table, minute, step * n) for minute, n in minutes.items()
+             if minute > oldest])
+        conn.execute("DELETE FROM _created WHERE class = ? "
+                     "AND (minute <= ? OR count <= 0)", (table, oldest))
+
+    def _log_changes(self, table: str, objs: List[TypeVar('Base')]):
+        """ Append the ids of `objs` to `_changes` and drop its rows
+        older than CHANGE_LOG_SIZE
+        """
+        if not objs:
+            return
+        conn = self._connection
+        conn.executemany("INSERT INTO _changes (class, id) VALUES (?, ?)",
+                         [(table, obj.id) for obj in objs])
+        seq = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.execute("DELETE FROM _changes WHERE seq <= ?",
+                     (seq - CHANGE_LOG_SIZE,))
+
+    def _refresh(self):
+        """ Drop from the cache the objects changed by other
+        connections since the last refresh
+        """
+        conn = self._connection
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == getattr(self._local, "data_version", None) and \
+                self._seq is not None:
+            return
+        self._local.data_version = version
+        with self._cache_lock:
+            seq = self._seq
+        last, = conn.execute("SELECT MAX(seq) FROM _changes").fetchone()
+        if seq is None or last is None:
+            rows, oldest = [], None
+        else:
+            rows = conn.execute(
+                "SELECT seq, class, id FROM _changes WHERE seq > ? "
+                "ORDER BY seq", (seq,)).fetchall()
+            oldest = rows[0][0] if rows else None
+        with self._cache_lock:
+            if self._seq is None or \
+                    (oldest is not None and oldest > self._seq + 1):
+                # First refresh, or changes missed: forget everything
+                self._cache.clear()
+            else:
+                for row_seq, s_class, obj_id in rows:
+                    if row_seq > self._seq:
+                        self._cache.pop((s_class, obj_id), None)
+            self._seq = max(last or 0, self._seq or 0)
+
+    def _uncache(self, table: str, objs: List[TypeVar('Base')]):
+        """ Drop `objs` from the cache
+        """
+        with self._cache_lock:
+            self._version += 1
+            for obj in objs:
+                self._cache.pop((table, obj.id), None)
+
+    def _transaction(self, func, *args):
+        """ Run `func(*args)` in a single transaction, return its result
+        """
+        conn = self._connection
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(*args)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def save(self, obj: TypeVar('Base')) -> bool:
+        """ Store `obj`, return True if it is new
+        """
+        return len(self.save_many(obj.__class__, [obj])) == 1
+
+    def save_many(self, cls: type,
+                  objs: List[TypeVar('Base')]) -> List[TypeVar('Base')]:
+        """ Store every object of `objs` in one transaction, return the
+        new ones
+        """
+        table = self._table(cls)
+        try:
+            return self._transaction(self._upsert, table, objs)
+        finally:
+            self._uncache(table, objs)
+
+    def remove(self, obj: TypeVar('Base')) -> bool:
+        """ Remove `obj`, return True if it was stored
+        """
+        return len(self.remove_many(obj.__class__, [obj])) == 1
+
+    def _delete(self, table: str,
+                objs: List[TypeVar('Base')]) -> List[TypeVar('Base')]:
+        """ Delete the rows of `objs`, return the objects deleted
+        """
+        query = 'DELETE FROM "{}" WHERE id = ?'.format(table)
+        conn = self._connection
+        deleted = [obj for obj in objs
+                   if conn.execute(query, (obj.id,)).rowcount]
+        self._log_changes(table, deleted)
+        self._count(table, deleted, -1)
+        return deleted
+
+    def remove_many(self, cls: type,
+                    objs: List[TypeVar('Base')]) -> List[TypeVar('Base')]:
+        """ Remove every object of `objs` in one transaction, return the
+        ones that were stored
+        """
+        table = self._table(cls)
+        try:
+            return self._transaction(self._delete, table, objs)
+        finally:
+            self._uncache(table, objs)
+
+    def created_since(self, cls: type, since: datetime) -> List[datetime]:
+        """ Return the creation date of the objects of `cls` created
+        since `since`
+        """
+        return self._created_since(self._table(cls), since)
+
+    def _created_since(self, table: str, since: datetime) -> List[datetime]:
+        """ Return the creation date of the rows of `table` created
+        since `since`
+        """
+        from models.base import TIMESTAMP_FORMAT, parse_timestamp
+        created_at = "json_extract(data, '$.created_at')"
+        query = 'SELECT {0} FROM "{1}" WHERE {0} >= ?'.format(
+            created_at, table)
+        rows = self._connection.execute(
+            query, (since.strftime(TIMESTAMP_FORMAT),))
+        return [parse_timestamp(row[0]) for row in rows]
+
+    def counters(self, cls: type, after: int) -> Tuple[int, Dict[int, int]]:
+        """ Return the number of objects of `cls`, and its creations by
+        minute since EPOCH after the minute `after`, shared by every
+        process
+        """
+        table = self._table(cls)
+        conn = self._connection
+        count, = conn.execute("SELECT count FROM _counts WHERE class = ?",
+                              (table,)).fetchone()
+        buckets = dict(conn.execute(
+            "SELECT minute, count FROM _created "
+            "WHERE class = ? AND minute > ?", (table, after)))
+        return count, buckets
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of `cls`
+        """
+        row = self._connection.execute(
+            'SELECT COUNT(*) FROM "{}"'.format(self._table(cls))).fetchone()
+        return row[0]
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of `cls` by ID, from the cache if it did
+        not change since it was read
+        """
+        table = self._table(cls)
+        if CACHE_SIZE > 0:
+            self._refresh()
+            with self._cache_lock:
+                obj = self._cache.get((table, id))
+                if obj is not None:
+                    self._cache.move_to_end((table, id))
+                    return obj
+                seq, version = self._seq, self._version
+        row = self._connection.execute(
+            'SELECT data FROM "{}" WHERE id = ?'.format(table),
+            (id,)).fetchone()
+        if row is None:
+            return None
+        obj = cls(**json.loads(row[0]))
+        if CACHE_SIZE > 0:
+            with self._cache_lock:
+                # Not cached if changes were applied or made since the
+                # read: the row may predate one of them
+                if self._seq == seq and self._version == version:
+                    self._cache[(table, id)] = obj
+                    while len(self._cache) > CACHE_SIZE:
+                        self._cache.popitem(last=False)
+        return obj
+
+    def page(self, cls: type, after: str = None,
+             limit: int = 100) -> List[TypeVar('Base')]:
+        """ Return up to `limit` objects of `cls` in id order, starting
+        after the id `after`, through the primary key index
+        """
+        query = 'SELECT data FROM "{}"'.format(self._table(cls))
+        params = []
+        if after is not None:
+            query += " WHERE id > ?"
+            params.append(after)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        return [cls(**json.loads(row[0]))
+                for row in self._connection.execute(query, params)]
+
+    def search(self, cls: type, query: Query) -> List[TypeVar('Base')]:
+        """ Return the objects of `cls` matching `query`
+
+        Conditions on id and indexed columns are evaluated by SQLite
+        through their index, and every condition is checked again on
+        the rows returned. When SQLite evaluates them all, it also
+        orders and limits the rows.
+        """
+        columns = self._columns(cls)
+        where = []
+        params = []
+        for condition in query.conditions:
+            clause = self._condition_sql(condition, columns)
+            if clause is not None:
+                where.append(clause[0])
+                params.extend(clause[1])
+        sql = 'SELECT data FROM "{}"'.format(self._table(cls))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        order = query.order_by
+        in_sql = len(where) == len(query.conditions) and \
+            (order is None or order == "id" or order in columns)
+        if in_sql and order is not None:
+            direction = " DESC" if query.descending else ""
+            sql += ' ORDER BY "{0}" IS NULL{1}, "{0}"{1}, id{1}'.format(
+                order, direction)
+        if in_sql and query.limit is not None:
+            sql += " LIMIT ?"
+            params.append(query.limit)
+        objs = (cls(**json.loads(row[0]))
+                for row in self._connection.execute(sql, params))
+        found = [obj for obj in objs if query.matches(obj)]
+        return found if in_sql else query.finish(found)
+
+    @staticmethod
+    def _condition_sql(condition: Condition, columns: Tuple[str, ...]
+                       ) -> Optional[Tuple[str, list]]:
+        """ Return the SQL clause and parameters of a condition on id
+        or an indexed column, or None
+        """
+        from models.base import format_timestamp
+
+        if condition.attr != "id" and condition.attr not in columns:
+            return None
+        values = []
+        for value in condition.value if condition.op == "in" \
+                else (condition.value,):
+            if isinstance(value, datetime):
+                value = format_timestamp(value)
+            elif type(value) not in (str, int, float) and \
+                    (value is not None or condition.op != "eq"):
+                return None
+            values.append(value)
+        column = '"{}"'.format(condition.attr)
+        op = condition.op
+        if op == "eq":
+            if values[0] is None:
+                return column + " IS NULL", []
+            return column + " = ?", values
+        if op == "in":
+            if not values:
+                return "0", []
+            return "{} IN ({})".format(
+                column, ", ".join("?" * len(values))), values
+        operators = {"lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+        if op in operators:
+            return "{} {} ?".format(column, operators[op]), values
+        if op == "startswith" and type(condition.value) is str:
+            low, _, high, _ = condition.bounds()
+            if high is None:
+                return column + " >= ?", [low]
+            return "{0} >= ? AND {0} < ?".format(column), [low, high]
+        return None
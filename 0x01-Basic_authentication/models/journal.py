@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+""" Journal module
+
+Append-only write-ahead log used by `Base` in journaled storage mode:
+each save or remove appends one JSON line, and loading replays the log
+on top of the last snapshot.
+"""
+from typing import Iterable, Iterator
+from os import path
+import json
+import os
+
+
+class Journal():
+    """ Append-only log of object changes for one class
+    """
+
+    def __init__(self, file_path: str, fsync: bool = False):
+        """ Initialize a Journal over `file_path`
+        """
+        self.file_path = file_path
+        self.fsync = fsync
+        self.records = 0
+        self._file = None
+
+    def append(self, op: str, obj_id: str, obj_json: dict = None):
+        """ Append one record, flushed before returning
+        """
+        self.append_many([(op, obj_id, obj_json)])
+
+    def append_many(self, records: Iterable[tuple]):
+        """ Append (op, id, JSON dict or None) records, flushed together
+        before returning
+        """
+        if self._file is None:
+            self._file = open(self.file_path, 'a')
+        for op, obj_id, obj_json in records:
+            record = {"op": op, "id": obj_id}
+            if obj_json is not None:
+                record["obj"] = obj_json
+            self._file.write(json.dumps(record) + "\n")
+            self.records += 1
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def replay(self) -> Iterator[dict]:
+        """ Yield every complete record of the log
+
+        A truncated or corrupted record can only be the result of a
+        crash in the middle of an append: it and anything after it
+        are ignored, and cut from the file so that new records are
+        not appended after it.
+        """
+        self.close()
+        self.records = 0
+        if not path.exists(self.file_path):
+            return
+        valid_size = 0
+        with open(self.file_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    break
+                valid_size += len(line)
+                self.records += 1
+                yield record
+        if valid_size < path.getsize(self.file_path):
+            with open(self.file_path, 'r+b') as f:
+                f.truncate(valid_size)
+
+    def truncate(self):
+        """ Empty the log once its records are part of a snapshot
+        """
+        self.close()
+        if path.exists(self.file_path):
+            os.remove(self.file_path)
+        self.records = 0
+
+    def close(self):
+        """ Close the underlying file
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
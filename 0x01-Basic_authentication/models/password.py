@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+""" Password module
+
+Salted password hashing with a configurable key derivation function.
+Hashes are encoded with their parameters, so that changing the
+configuration only affects new hashes, and old ones can be detected
+and upgraded at the next login:
+
+- "scrypt$<n>$<r>$<p>$<salt>$<hash>"
+- "pbkdf2_sha256$<iterations>$<salt>$<hash>"
+- 64 hexadecimal digits: legacy unsalted SHA256, verify only
+
+Verifications run in a bounded pool of worker threads: hashlib releases
+the GIL while deriving keys, so a burst of logins uses every core
+without starving the request threads. Bulk hashing runs in a separate,
+smaller pool, so that it never queues ahead of logins.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+from typing import List
+import base64
+import hashlib
+import hmac
+import os
+import threading
+
+
+HASH_ALGORITHM = getenv("PASSWORD_HASH_ALGORITHM", "scrypt")
+SCRYPT_N = int(getenv("PASSWORD_SCRYPT_N", "16384"))
+SCRYPT_R = int(getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(getenv("PASSWORD_SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(getenv("PASSWORD_PBKDF2_ITERATIONS", "600000"))
+SALT_SIZE = 16
+# Threads deriving keys, and verifications allowed to wait for one
+VERIFY_WORKERS = int(getenv("PASSWORD_VERIFY_WORKERS",
+                            str(os.cpu_count() or 1)))
+VERIFY_QUEUE_SIZE = int(getenv("PASSWORD_VERIFY_QUEUE_SIZE",
+                               str(4 * VERIFY_WORKERS)))
+VERIFIER = ThreadPoolExecutor(max_workers=VERIFY_WORKERS,
+                              thread_name_prefix="password-verify")
+VERIFY_SLOTS = threading.BoundedSemaphore(VERIFY_WORKERS +
+                                          VERIFY_QUEUE_SIZE)
+# Threads hashing the passwords of bulk requests
+HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS",
+                          str(max(1, VERIFY_WORKERS // 2))))
+HASHER = ThreadPoolExecutor(max_workers=HASH_WORKERS,
+                            thread_name_prefix="password-hash")
+
+
+def _b64encode(data: bytes) -> str:
+    """ Encode bytes in unpadded base64
+    """
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    """ Decode unpadded base64
+    """
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _scrypt(pwd: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """ Derive a 32 bytes key with scrypt
+    """
+    return hashlib.scrypt(pwd.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=32)
+
+
+def _pbkdf2(pwd: str, salt: bytes, iterations: int) -> bytes:
+    """ Derive a 32 bytes key with PBKDF2-HMAC-SHA256
+    """
+    return hashlib.pbkdf2_hmac("sha256", pwd.encode(), salt, iterations)
+
+
+def hash_password(pwd: str) -> str:
+    """ Hash a password with a new salt and the configured algorithm
+    """
+    salt = os.urandom(SALT_SIZE)
+    if HASH_ALGORITHM == "pbkdf2_sha256":
+        key = _pbkdf2(pwd, salt, PBKDF2_ITERATIONS)
+        return "pbkdf2_sha256${}${}${}".format(
+            PBKDF2_ITERATIONS, _b64encode(salt), _b64encode(key))
+    if HASH_ALGORITHM == "scrypt":
+        key = _scrypt(pwd, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return "scrypt${}${}${}${}${}".format(
+            SCRYPT_N, SCRYPT_R, SCRYPT_P, _b64encode(salt), _b64encode(key))
+    raise ValueError("Unknown password hash algorithm: {}".format(
+        HASH_ALGORITHM))
+
+
+def verify_password(pwd: str, encoded: str) -> bool:
+    """ Check a password against an encoded hash in constant time
+    """
+    try:
+        parts = encoded.split("$")
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            key = _scrypt(pwd, _b64decode(parts[4]), n, r, p)
+            return hmac.compare_digest(key, _b64decode(parts[5]))
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            key = _pbkdf2(pwd, _b64decode(parts[2]), int(parts[1]))
+            return hmac.compare_digest(key, _b64decode(parts[3]))
+        if len(parts) == 1 and len(encoded) == 64:
+            digest = hashlib.sha256(pwd.encode()).hexdigest()
+            return hmac.compare_digest(digest, encoded.lower())
+    except (TypeError, ValueError):
+        return False
+    return False
+
+
+def verify_password_in_pool(pwd: str, encoded: str) -> bool:
+    """ Run `verify_password` in the verification pool
+
+    At most VERIFY_WORKERS verifications run at once and
+    VERIFY_QUEUE_SIZE wait for a worker; further callers block until
+    a slot frees up.
+    """
+    with VERIFY_SLOTS:
+        return VERIFIER.submit(verify_password, pwd, encoded).result()
+
+
+def hash_passwords_in_pool(pwds: List[str]) -> List[str]:
+    """ Hash several passwords, in parallel in the hashing pool
+    """
+    return list(HASHER.map(hash_password, pwds))
+
+
+def needs_rehash(encoded: str) -> bool:
+    """ Check if a hash was made with other than the current settings
+    """
+    parts = encoded.split("$")
+    if HASH_ALGORITHM == "scrypt":
+        return parts[:4] != ["scrypt", str(SCRYPT_N), str(SCRYPT_R),
+                             str(SCRYPT_P)]
+    if HASH_ALGORITHM == "pbkdf2_sha256":
+        return parts[:2] != ["pbkdf2_sha256", str(PBKDF2_ITERATIONS)]
+    return False
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+""" Query module
+
+A query is a set of conditions on attributes, an optional order and an
+optional limit. Conditions are written as a dict, like the attributes
+of `Base.search()`: a key is an attribute name, optionally followed by
+`__` and an operator, and equality is the default:
+
+    {"email__startswith": "bob", "created_at__gte": datetime(2024, 1, 1),
+     "id__in": ["id1", "id2"], "last_name": "Smith"}
+
+Operators: eq, ne, in, lt, lte, gt, gte, startswith, endswith. Any
+other `__` suffix is an error, so attribute names cannot contain `__`.
+
+Storage engines plan a query with the indexes they have for its
+conditions, see `Condition.bounds()`, then check every condition on
+the candidates with `Query.matches()`.
+"""
+from heapq import nsmallest
+from typing import Iterable, List, Optional, TypeVar
+
+
+OPERATORS = ("eq", "ne", "in", "lt", "lte", "gt", "gte",
+             "startswith", "endswith")
+
+
+def prefix_successor(prefix: str) -> Optional[str]:
+    """ Smallest string greater than every string starting with
+    `prefix`, None if there is none
+    """
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+class Condition():
+    """ Condition on one attribute
+    """
+    __slots__ = ('attr', 'op', 'value')
+
+    def __init__(self, attr: str, op: str, value):
+        """ Initialize a Condition, ValueError if `op` is unknown
+        """
+        if op not in OPERATORS:
+            raise ValueError("Unknown operator: {}".format(op))
+        if op == "in":
+            value = tuple(value)
+        self.attr = attr
+        self.op = op
+        self.value = value
+
+    def __repr__(self) -> str:
+        """ Representation, for plans
+        """
+        return "{}__{}={!r}".format(self.attr, self.op, self.value)
+
+    def test(self, obj: TypeVar('Base')) -> bool:
+        """ Check the condition on `obj`
+        """
+        value = getattr(obj, self.attr)
+        op = self.op
+        if op == "eq":
+            return value == self.value
+        if op == "ne":
+            return value != self.value
+        if op == "in":
+            return value in self.value
+        if op in ("startswith", "endswith"):
+            return type(value) is str and getattr(value, op)(self.value)
+        try:
+            if op == "lt":
+                return value < self.value
+            if op == "lte":
+                return value <= self.value
+            if op == "gt":
+                return value > self.value
+            return value >= self.value
+        except TypeError:
+            return False
+
+    def bounds(self) -> Optional[tuple]:
+        """ Value range matched by the condition, as (low, low
+        inclusive, high, high inclusive) with None for no bound, or
+        None if it is not a range
+        """
+        op = self.op
+        if op == "eq":
+            return (self.value, True, self.value, True)
+        if op in ("lt", "lte"):
+            return (None, False, self.value, op == "lte")
+        if op in ("gt", "gte"):
+            return (self.value, op == "gte", None, False)
+        if op == "startswith" and type(self.value) is str:
+            return (self.value, True, prefix_successor(self.value), False)
+        return None
+
+
+class Query():
+    """ Conditions, order and limit of a search
+    """
+
+    def __init__(self, attributes: dict = None, order_by: str = None,
+                 limit: int = None):
+        """ Initialize a Query
+
+        `order_by` is an attribute name, prefixed with '-' for a
+        descending order. ValueError if a key has an unknown `__`
+        operator suffix, like `email__bogus`.
+        """
+        self.conditions = []
+        for key, value in (attributes or {}).items():
+            attr, _, op = key.rpartition("__")
+            if not attr:
+                attr, op = key, "eq"
+            self.conditions.append(Condition(attr, op, value))
+        self.descending = order_by is not None and order_by.startswith("-")
+        self.order_by = order_by[1:] if self.descending else order_by
+        self.limit = limit
+
+    def matches(self, obj: TypeVar('Base'),
+                skip: Condition = None) -> bool:
+        """ Check every condition on `obj`, but `skip`
+        """
+        for condition in self.conditions:
+            if condition is not skip and not condition.test(obj):
+                return False
+        return True
+
+    def sort_key(self, obj: TypeVar('Base')) -> tuple:
+        """ Key ordering objects by `order_by`, then by id, None last
+        """
+        value = getattr(obj, self.order_by)
+        return (value is None, value, obj.id)
+
+    def finish(self, objs: Iterable[TypeVar('Base')]
+               ) -> List[TypeVar('Base')]:
+        """ Order and limit objects that match the conditions
+        """
+        if self.order_by is None:
+            objs = list(objs)
+            return objs if self.limit is None else objs[:self.limit]
+        if self.limit is not None and not self.descending:
+            return nsmallest(self.limit, objs, key=self.sort_key)
+        objs = sorted(objs, key=self.sort_key, reverse=self.descending)
+        return objs if self.limit is None else objs[:self.limit]
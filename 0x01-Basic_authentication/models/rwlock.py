@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+""" Readers-writer lock module
+
+Many threads may read a class at once, while a change waits for the
+readers to finish and holds the class alone. Waiting writers go first,
+so a steady flow of reads cannot starve them.
+
+The lock is not reentrant: a thread holding it must not acquire it
+again.
+"""
+from contextlib import contextmanager
+from typing import Iterator
+import threading
+
+
+class RWLock():
+    """ Readers-writer lock preferring writers
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked RWLock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        """ Wait until no writer holds or waits for the lock, then
+        share it
+        """
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        """ Release a shared hold
+        """
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """ Wait until nobody holds the lock, then hold it alone
+        """
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        """ Release an exclusive hold
+        """
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Hold the lock shared for the duration of a `with` block
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Hold the lock alone for the duration of a `with` block
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
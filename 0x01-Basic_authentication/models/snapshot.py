@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+""" Snapshot module
+
+Streaming reader and writer for the `.db_<Class>.json` files, so that
+objects are parsed and serialized one at a time instead of through one
+giant dict.
+
+Two formats are supported:
+- "json": the legacy single JSON object mapping ids to objects
+- "ndjson": one JSON object per line
+"""
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from os import path
+import json
+import os
+import re
+
+
+CHUNK_SIZE = 1 << 16
+_decoder = json.JSONDecoder()
+# Start of a legacy file
+LEGACY_PATTERN = re.compile(rb'\s*\{\s*"(?:[^"\\]|\\.)*"\s*:\s*\{')
+# Start of an ndjson line whose id needs no unescaping
+ID_PATTERN = re.compile(rb'\{"id": "([^"\\]*)"')
+
+
+class _Reader():
+    """ Buffered reader decoding JSON values one at a time
+    """
+
+    def __init__(self, f):
+        """ Initialize a _Reader over the text file `f`
+        """
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        """ Read one more chunk, return False at end of file
+        """
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """ Return the next non-whitespace character, "" at the end
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        """ Consume `char`, the next non-whitespace character
+        """
+        if self.peek() != char:
+            raise ValueError("Expected '{}' at offset {}".format(
+                char, self.f.tell()))
+        self.pos += 1
+
+    def value(self):
+        """ Decode the next complete JSON value
+        """
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self.buf) and self._fill():
+                # A number may continue in the next chunk
+                continue
+            self.pos = end
+            return obj
+
+
+def _read_legacy(reader: _Reader) -> Iterator[dict]:
+    """ Yield the objects of a legacy {id: object} file
+    """
+    while True:
+        reader.value()
+        reader.expect(':')
+        yield reader.value()
+        if reader.peek() == '}':
+            return
+        reader.expect(',')
+
+
+def read_snapshot(file_path: str) -> Iterator[dict]:
+    """ Yield the JSON dict of each object stored in `file_path`
+
+    The format is detected from the first entry: legacy files map ids
+    to objects, while the first key of an ndjson line maps to a scalar.
+    """
+    if not path.exists(file_path):
+        return
+    with open(file_path, 'r') as f:
+        reader = _Reader(f)
+        if reader.peek() == "":
+            return
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        reader.value()
+        reader.expect(':')
+        is_legacy = reader.peek() == '{'
+        f.seek(0)
+        reader = _Reader(f)
+        if is_legacy:
+            reader.expect('{')
+            yield from _read_legacy(reader)
+            return
+        while reader.peek() != "":
+            yield reader.value()
+
+
+def index_snapshot(file_path: str) -> Optional[Dict[str, int]]:
+    """ Return the offset of the line of each object of an ndjson file
+    by id, or None for any other file, like a legacy one or `{}`
+
+    Only the id at the start of each line is decoded, so indexing is
+    much faster than reading the objects.
+    """
+    offsets = {}
+    if not path.exists(file_path):
+        return offsets
+    with open(file_path, 'rb') as f:
+        if LEGACY_PATTERN.match(f.read(CHUNK_SIZE)):
+            return None
+        f.seek(0)
+        offset = 0
+        for line in f:
+            match = ID_PATTERN.match(line)
+            if match:
+                offsets[match.group(1).decode()] = offset
+            elif line.strip():
+                try:
+                    obj_json = json.loads(line)
+                except ValueError:
+                    return None
+                if type(obj_json) is not dict or \
+                        type(obj_json.get("id")) is not str:
+                    return None
+                offsets[obj_json["id"]] = offset
+            offset += len(line)
+    return offsets
+
+
+def read_line(file_path: str, offset: int) -> dict:
+    """ Return the JSON dict of the ndjson line at `offset`
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+
+def write_snapshot(file_path: str, objs: Iterable[Tuple[str, dict]],
+                   fmt: str = "json"):
+    """ Atomically replace `file_path` with the (id, JSON dict) pairs
+
+    Objects are written as they are produced, to a temporary file that
+    is synced and renamed, so the file is always either the previous or
+    the new complete snapshot. The "json" format is byte-identical to
+    `json.dump` of the whole dict.
+    """
+    tmp_path = "{}.tmp".format(file_path)
+    with open(tmp_path, 'w') as f:
+        if fmt == "ndjson":
+            for obj_id, obj_json in objs:
+                f.write(json.dumps(obj_json))
+                f.write("\n")
+        else:
+            f.write("{")
+            separator = ""
+            for obj_id, obj_json in objs:
+                f.write("{}{}: {}".format(separator, json.dumps(obj_id),
+                                          json.dumps(obj_json)))
+                separator = ", "
+            f.write("}")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+    dir_fd = os.open(path.dirname(path.abspath(file_path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+""" Stats module
+
+Counters of the stored objects of each class, maintained on every save
+and removal so that reading them never touches the storage. Creations
+are also counted per minute over the last day.
+
+A class is seeded from the storage when it is loaded, or before its
+objects are first changed or counted. An engine shared between processes, whose
+`shares_counters` is True, maintains the same counters itself in the
+same transaction as each change, and they are read from it instead.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, TypeVar
+import threading
+
+
+WINDOW = timedelta(days=1)
+EPOCH = datetime(1970, 1, 1)
+# Class name -> number of stored objects
+COUNTS = {}
+# Class name -> {minute since EPOCH: objects created during it}
+CREATED = {}
+LOCK = threading.Lock()
+
+
+def to_minute(value: datetime) -> int:
+    """ Minutes between EPOCH and `value`
+    """
+    return int((value - EPOCH).total_seconds()) // 60
+
+
+def _prune(buckets: Dict[int, int], now: int):
+    """ Drop the buckets older than WINDOW
+    """
+    oldest = now - int(WINDOW.total_seconds()) // 60
+    for minute in [m for m in buckets if m <= oldest]:
+        del buckets[minute]
+
+
+def _add(buckets: Dict[int, int], dates: Iterable[datetime], step: int):
+    """ Add `step` to the bucket of every date of the last day
+    """
+    now = to_minute(datetime.utcnow())
+    oldest = now - int(WINDOW.total_seconds()) // 60
+    for date in dates:
+        minute = to_minute(date)
+        if minute <= oldest:
+            continue
+        count = buckets.get(minute, 0) + step
+        if count > 0:
+            buckets[minute] = count
+        else:
+            buckets.pop(minute, None)
+    _prune(buckets, now)
+
+
+def _shared() -> bool:
+    """ Whether the storage maintains the counters itself
+    """
+    import models
+    return models.storage.shares_counters
+
+
+def seed(cls: type, count: int):
+    """ Reset the counters of `cls` to `count` objects, reading the
+    recent creations from the storage
+    """
+    if _shared():
+        return
+    import models
+    since = datetime.utcnow() - WINDOW
+    created = models.storage.created_since(cls, since)
+    with LOCK:
+        COUNTS[cls.__name__] = count
+        CREATED[cls.__name__] = {}
+        _add(CREATED[cls.__name__], created, 1)
+
+
+def forget(cls: type):
+    """ Drop the counters of `cls`, seeded again when next needed
+    """
+    with LOCK:
+        COUNTS.pop(cls.__name__, None)
+        CREATED.pop(cls.__name__, None)
+
+
+def ensure(cls: type):
+    """ Seed the counters of `cls` if it was never counted
+
+    Called before changing objects of `cls`, so that the seed does not
+    already include the change then counted by `created()`/`removed()`.
+    """
+    if _shared():
+        return
+    if cls.__name__ not in COUNTS:
+        import models
+        seed(cls, models.storage.count(cls))
+
+
+def created(cls: type, objs: Iterable[TypeVar('Base')]):
+    """ Count new objects of `cls`, unless it is not counted yet: its
+    next seed reads them from the storage
+    """
+    if _shared():
+        return
+    dates = [obj.created_at for obj in objs]
+    with LOCK:
+        if cls.__name__ in COUNTS:
+            COUNTS[cls.__name__] += len(dates)
+            _add(CREATED[cls.__name__], dates, 1)
+
+
+def removed(cls: type, objs: Iterable[TypeVar('Base')]):
+    """ Uncount removed objects of `cls`, unless it is not counted yet
+    """
+    if _shared():
+        return
+    dates = [obj.created_at for obj in objs]
+    with LOCK:
+        if cls.__name__ in COUNTS:
+            COUNTS[cls.__name__] -= len(dates)
+            _add(CREATED[cls.__name__], dates, -1)
+
+
+def _summary(count: int, buckets: Dict[int, int], now: int) -> dict:
+    """ Return `count` and the creations of the last hour and day
+    """
+    return {
+        "count": count,
+        "created_last_hour": sum(n for m, n in buckets.items()
+                                 if m > now - 60),
+        "created_last_day": sum(buckets.values())
+    }
+
+
+def snapshot(cls: type) -> dict:
+    """ Return the number of objects of `cls`, and how many were
+    created in the last hour and the last day
+    """
+    now = to_minute(datetime.utcnow())
+    if _shared():
+        import models
+        count, buckets = models.storage.counters(
+            cls, now - int(WINDOW.total_seconds()) // 60)
+        return _summary(count, buckets, now)
+    ensure(cls)
+    with LOCK:
+        buckets = CREATED[cls.__name__]
+        _prune(buckets, now)
+        return _summary(COUNTS[cls.__name__], buckets, now)
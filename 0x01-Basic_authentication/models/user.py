@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 """ User module
 """
-import hashlib
 from models.base import Base
+from models.password import hash_password, hash_passwords_in_pool, \
+    needs_rehash, verify_password_in_pool
+from typing import List
 
 
 class User(Base):
     """ User class
     """
+    _indexed_attributes = ('email',)
+    _sorted_attributes = ('email', 'created_at')
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
@@ -26,22 +30,33 @@ class User(Base):
 
     @password.setter
     def password(self, pwd: str):
-        """ Setter of a new password: encrypt in SHA256
+        """ Setter of a new password: hash it with a salted KDF
         """
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            self._password = hash_password(pwd)
+
+    @classmethod
+    def set_passwords(cls, users: List['User'], pwds: List[str]):
+        """ Set the password of several users, hashed in parallel
+        """
+        for user, pwd in zip(users, hash_passwords_in_pool(pwds)):
+            user._password = pwd
 
     def is_valid_password(self, pwd: str) -> bool:
-        """ Validate a password
+        """ Validate a password, in the password verification pool
         """
         if pwd is None or type(pwd) is not str:
             return False
         if self.password is None:
             return False
-        pwd_e = pwd.encode()
-        return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
+        return verify_password_in_pool(pwd, self.password)
+
+    def password_needs_rehash(self) -> bool:
+        """ Check if the password hash uses outdated parameters
+        """
+        return self.password is not None and needs_rehash(self.password)
 
     def display_name(self) -> str:
         """ Display User name based on email/first_name/last_name
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+""" Writer module
+
+Coalescing persistence for `Base`: classes changed in a burst are marked
+dirty and written by a single background thread at most once per
+interval, instead of once per change.
+"""
+from typing import TypeVar
+import atexit
+import threading
+import time
+
+
+class Writer():
+    """ Single writer flushing dirty classes to their files
+    """
+
+    def __init__(self, interval_ms: int):
+        """ Initialize a Writer flushing at most every `interval_ms`
+        """
+        self.interval = interval_ms / 1000
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def mark_dirty(self, cls: TypeVar('Base')):
+        """ Schedule a write of all objects of `cls`
+        """
+        with self._lock:
+            self._dirty[cls.__name__] = cls
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="models-writer",
+                                                daemon=True)
+                self._thread.start()
+        self._pending.set()
+
+    def flush(self):
+        """ Write every dirty class now
+
+        A class whose write fails stays dirty and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                dirty = self._dirty
+                self._dirty = {}
+            for s_class, cls in dirty.items():
+                try:
+                    cls.save_to_file()
+                except Exception:
+                    with self._lock:
+                        self._dirty.setdefault(s_class, cls)
+                    raise
+
+    def _run(self):
+        """ Flush dirty classes, then wait out the interval
+        """
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            try:
+                self.flush()
+            except Exception:
+                self._pending.set()
+            time.sleep(self.interval)
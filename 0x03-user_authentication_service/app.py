@@ -2,12 +2,21 @@
 """API application module."""
 
 from flask import Flask, jsonify, request, abort
-from auth import Auth, BasicAuth
+from auth import Auth, MAX_PASSWORD_BYTES, password_too_long
 from db import DB
-from user import User
+from sweeper import SessionSweeper
 
 app = Flask(__name__)
-auth = BasicAuth()
+db = DB()
+auth = Auth(db)
+sweeper = SessionSweeper(db, auth.session_ttl, auth.session_cache)
+sweeper.start()
+
+
+@app.teardown_appcontext
+def close_db_session(exception) -> None:
+    """Return the database connection of the request to the pool."""
+    db.close_session()
 
 @app.route('/', methods=['GET'])
 def home():
@@ -22,6 +31,9 @@ def register_user():
 
     if not email or not password:
         return jsonify({"message": "email and password required"}), 400
+    if password_too_long(password):
+        return jsonify({"message": "password longer than {} bytes".format(
+            MAX_PASSWORD_BYTES)}), 400
 
     try:
         user = auth.create_user(email, password)
@@ -44,7 +56,8 @@ def login():
 
     session_id = auth.create_session(user.id)
     response = jsonify({"email": email, "message": "logged in"})
-    response.set_cookie("session_id", session_id)
+    response.set_cookie("session_id", session_id, httponly=True,
+                        samesite="Lax")
     return response
 
 @app.route('/sessions', methods=['DELETE'])
@@ -52,7 +65,7 @@ def logout():
     """Logout user and destroy session."""
     session_id = request.cookies.get('session_id')
 
-    if not session_id or not auth.destroy_session(request):
+    if not session_id or not auth.destroy_session(session_id):
         abort(403)
 
     return jsonify({"message": "logout successful"}), 200
@@ -91,6 +104,9 @@ def update_password():
 
     if not email or not reset_token or not new_password:
         abort(403)
+    if password_too_long(new_password):
+        return jsonify({"message": "password longer than {} bytes".format(
+            MAX_PASSWORD_BYTES)}), 400
 
     try:
         auth.update_password(reset_token, new_password)
@@ -1,81 +1,189 @@
 #!/usr/bin/env python3
-"""Auth module for API authentication."""
+"""
+Auth module.
+Registers users, checks their passwords and manages their sessions and
+password reset tokens over the DB.
 
-from flask import request
-from typing import List, TypeVar
-import re
+Passwords are hashed with bcrypt, whose cost is BCRYPT_ROUNDS (default
+12), and bcrypt only accepts up to MAX_PASSWORD_BYTES bytes: longer
+passwords are rejected at registration and never valid at login.
+Session ids and reset tokens are random UUID4s, and a user has at most
+one of each, stored in indexed columns. A session expires
+SESSION_TTL seconds after it was created (default 86400, 0 never
+expires), see SessionSweeper for their removal. The users of recent
+sessions are cached in memory, see SessionCache, of SESSION_CACHE_SIZE
+sessions (default 10000, 0 disables it) for SESSION_CACHE_TTL seconds
+(default 60).
+"""
 
+from datetime import datetime, timedelta
+from os import getenv
+from typing import Optional
+from sqlalchemy.orm.exc import NoResultFound
+import bcrypt
+import uuid
 
-class Auth:
-    """Auth class for authentication in API."""
-
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
-        """Check if the path requires authentication."""
-        if not path or not excluded_paths:
-            return True
-
-        for p in excluded_paths:
-            if p.endswith('*'):
-                if path.startswith(p[:-1]):
-                    return False
-            elif path == p or path == p.rstrip('/'):
-                return False
-        return True
+from db import DB
+from session_cache import SessionCache
+from user import User
 
-    def authorization_header(self, request=None) -> str:
-        """Get the Authorization header from the request."""
-        if request is None:
-            return None
-        return request.headers.get('Authorization')
 
-    def current_user(self, request=None) -> TypeVar('User'):
-        """Get the current user based on the request."""
-        return None
+BCRYPT_ROUNDS = int(getenv("BCRYPT_ROUNDS", "12"))
+SESSION_TTL = float(getenv("SESSION_TTL", "86400"))
+MAX_PASSWORD_BYTES = 72
+# Checked against when the email is unknown, so that a login takes as
+# long whether the user exists or not
+_DUMMY_HASH = bcrypt.hashpw(b"dummy password",
+                            bcrypt.gensalt(BCRYPT_ROUNDS))
 
 
-class BasicAuth(Auth):
-    """BasicAuth class for Basic Authentication."""
+def password_too_long(password: str) -> bool:
+    """Returns True if bcrypt cannot hash the password."""
+    return len(password.encode("utf-8")) > MAX_PASSWORD_BYTES
 
-    def extract_base64_authorization_header(self, auth_header: str) -> str:
-        """Extract the Base64 part from the Authorization header."""
-        if not auth_header or not auth_header.startswith('Basic '):
-            return None
-        return auth_header.split(' ', 1)[1]
 
-    def decode_base64_authorization_header(self, b64_auth_header: str) -> str:
-        """Decode the Base64 Authorization header."""
-        if not b64_auth_header:
+def _hash_password(password: str) -> bytes:
+    """Returns the salted bcrypt hash of a password.
+
+    Raises ValueError if the password is too long for bcrypt.
+    """
+    if password_too_long(password):
+        raise ValueError("Password longer than {} bytes".format(
+            MAX_PASSWORD_BYTES))
+    return bcrypt.hashpw(password.encode("utf-8"),
+                         bcrypt.gensalt(BCRYPT_ROUNDS))
+
+
+def _generate_uuid() -> str:
+    """Returns a new random UUID4 as a string."""
+    return str(uuid.uuid4())
+
+
+class Auth:
+    """Auth class to interact with the authentication database."""
+
+    def __init__(self, db: DB = None, session_ttl: float = None) -> None:
+        """Initialize a new Auth instance over `db`, a new DB by
+        default, whose sessions last `session_ttl` seconds, SESSION_TTL
+        by default."""
+        self._db = db if db is not None else DB()
+        self.session_ttl = SESSION_TTL if session_ttl is None \
+            else session_ttl
+        self.session_cache = SessionCache(
+            int(getenv("SESSION_CACHE_SIZE", "10000")),
+            float(getenv("SESSION_CACHE_TTL", "60")))
+
+    def create_user(self, email: str, password: str) -> User:
+        """Registers a user with a hashed password.
+
+        Raises ValueError if the email is already registered or the
+        password is too long.
+        """
+        return self._db.add_user(email, _hash_password(password).decode())
+
+    def valid_login(self, email: str, password: str) -> Optional[User]:
+        """Returns the user if the email and password match, else None."""
+        if password_too_long(password):
             return None
         try:
-            return base64.b64decode(b64_auth_header).decode('utf-8')
-        except Exception:
+            user = self._db.find_user_by(email=email)
+        except NoResultFound:
+            bcrypt.checkpw(password.encode("utf-8"), _DUMMY_HASH)
+            return None
+        if not bcrypt.checkpw(password.encode("utf-8"),
+                              user.hashed_password.encode()):
             return None
+        return user
 
-    def extract_user_credentials(self, decoded_header: str) -> (str, str):
-        """Extract user credentials from the decoded header."""
-        if not decoded_header or ':' not in decoded_header:
-            return None, None
-        return tuple(decoded_header.split(':', 1))
+    def create_session(self, user_id: int) -> str:
+        """Returns a new session id for the user, replacing the
+        previous one."""
+        session_id = _generate_uuid()
+        self._db.update_user(user_id, session_id=session_id,
+                             session_created_at=datetime.utcnow())
+        user = self._db.find_user_by(id=user_id)
+        self.session_cache.put(session_id, user.id, user.email,
+                               lifetime=self._lifetime(user))
+        return session_id
 
-    def user_object_from_credentials(self, user_email: str,
-                                     user_pwd: str) -> TypeVar('User'):
-        """Get the User object based on email and password."""
-        if not user_email or not user_pwd:
+    def _lifetime(self, user: User) -> Optional[float]:
+        """Returns the seconds left before the session of the user
+        expires, None if sessions do not expire."""
+        if self.session_ttl <= 0:
             return None
+        if user.session_created_at is None:
+            # Created before sessions expired
+            return 0
+        expires_at = user.session_created_at + timedelta(
+            seconds=self.session_ttl)
+        return (expires_at - datetime.utcnow()).total_seconds()
 
+    def get_user_from_session_id(self,
+                                 session_id: str) -> Optional[User]:
+        """Returns the user of a session, or None.
+
+        On a cache hit, the user is not read from the database: only its
+        id and email are set.
+        """
+        if not session_id:
+            return None
+        cached = self.session_cache.get(session_id)
+        if cached is not None:
+            return User(id=cached[0], email=cached[1])
+        version = self.session_cache.version()
         try:
-            user = User.search({"email": user_email})
-            if not user:
-                return None
-            if user.is_valid_password(user_pwd):
-                return user
-        except Exception:
+            user = self._db.find_user_by(session_id=session_id)
+        except NoResultFound:
             return None
+        lifetime = self._lifetime(user)
+        if lifetime is not None and lifetime <= 0:
+            return None
+        self.session_cache.put(session_id, user.id, user.email, version,
+                               lifetime)
+        return user
 
-    def current_user(self, request=None) -> TypeVar('User'):
-        """Get the current authenticated user."""
-        auth_header = self.authorization_header(request)
-        b64_auth_header = self.extract_base64_authorization_header(auth_header)
-        decoded_header = self.decode_base64_authorization_header(b64_auth_header)
-        email, password = self.extract_user_credentials(decoded_header)
-        return self.user_object_from_credentials(email, password)
+    def destroy_session(self, session_id: str) -> bool:
+        """Ends a session, returning False if it does not exist."""
+        if not session_id:
+            return False
+        try:
+            user = self._db.find_user_by(session_id=session_id)
+        except NoResultFound:
+            self.session_cache.invalidate(session_id)
+            return False
+        self._db.update_user(user.id, session_id=None,
+                             session_created_at=None)
+        self.session_cache.invalidate(session_id)
+        return True
+
+    def get_reset_password_token(self, email: str) -> str:
+        """Returns a new password reset token for the user.
+
+        Raises ValueError if the email is not registered.
+        """
+        try:
+            user = self._db.find_user_by(email=email)
+        except NoResultFound:
+            raise ValueError("User {} not found".format(email))
+        reset_token = _generate_uuid()
+        self._db.update_user(user.id, reset_token=reset_token)
+        return reset_token
+
+    def update_password(self, reset_token: str, password: str) -> None:
+        """Sets the password of the user of a reset token, which can
+        only be used once, and ends their session.
+
+        Raises ValueError if the token is not valid or the password is
+        too long.
+        """
+        if not reset_token:
+            raise ValueError("Invalid reset token")
+        try:
+            user = self._db.find_user_by(reset_token=reset_token)
+        except NoResultFound:
+            raise ValueError("Invalid reset token")
+        self._db.update_user(user.id,
+                             hashed_password=_hash_password(password).decode(),
+                             reset_token=None, session_id=None,
+                             session_created_at=None)
+        self.session_cache.invalidate_user(user.id)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the login path of the database layer from many threads.
+
+THREADS threads repeat what a login and a profile view ask of DB: find
+a user by email, store a new session id, and find the user by session
+id, closing their session after each, as the app does after a request.
+Runs for SECONDS with SQL logging off and on, each in a fresh process
+and database, and reports the logins per second as JSON.
+
+Usage: python3 -m benchmarks.db_throughput [SECONDS] [THREADS]
+"""
+from benchmarks import is_child, run_child
+import json
+import sys
+import threading
+import time
+import uuid
+
+
+CONFIGURATIONS = {
+    "default": {},
+    "echo": {"DB_ECHO": "1"},
+}
+USERS = 1000
+
+
+def _worker(db, deadline: float, counts: list, thread: int) -> None:
+    """Log users in until `deadline`."""
+    i = thread
+    while time.monotonic() < deadline:
+        user = db.find_user_by(email="user{}@example.com".format(i % USERS))
+        session_id = str(uuid.uuid4())
+        db.update_user(user.id, session_id=session_id)
+        assert db.find_user_by(session_id=session_id).id == user.id
+        db.close_session()
+        counts[thread] += 1
+        i += 7
+
+
+def measure(seconds: float, threads: int) -> dict:
+    """Fill a database of the current directory and log users in."""
+    from db import DB
+
+    db = DB()
+    for i in range(USERS):
+        db.add_user("user{}@example.com".format(i), "hash")
+    db.close_session()
+    counts = [0] * threads
+    deadline = time.monotonic() + seconds
+    workers = [threading.Thread(target=_worker,
+                                args=(db, deadline, counts, t))
+               for t in range(threads)]
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return {
+        "threads": threads,
+        "logins_per_sec": round(sum(counts) / (time.monotonic() - start), 1)
+    }
+
+
+def main():
+    """Measure each configuration in its own process and directory."""
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    if is_child():
+        # SQL logs go to stdout too: the results are the last line
+        print(json.dumps(measure(seconds, threads)))
+        return
+    results = {name: run_child("benchmarks.db_throughput", seconds, threads,
+                               env=dict(config, DB_URL=None))
+               for name, config in CONFIGURATIONS.items()}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark of DB.find_user_by over growing SQLite users tables.
+
+For each N, fills a fresh database with N users in a temporary
+directory, then measures the latency of find_user_by on the indexed
+email, session_id and reset_token columns, and on the unindexed
+hashed_password column for comparison, as JSON. Indexed lookups should
+stay flat as N grows, while the scan grows linearly.
+
+Usage: python3 -m benchmarks.find_user_by [N ...]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+BATCH_SIZE = 10000
+LOOKUPS = 2000
+SCANS = 20
+
+
+def _latencies(func, calls: int) -> dict:
+    """Call func(i) `calls` times and return its latency percentiles."""
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "calls": calls,
+        "p50_us": round(latencies[len(latencies) // 2] * 1e6, 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 1)
+    }
+
+
+def measure(n: int) -> dict:
+    """Fill a database of the current directory and time lookups."""
+    from db import DB
+    from user import User
+
+    db = DB()
+    db._engine.echo = False
+    start = time.perf_counter()
+    with db._engine.begin() as connection:
+        for first in range(0, n, BATCH_SIZE):
+            connection.execute(User.__table__.insert(), [
+                {"email": "user{}@example.com".format(i),
+                 "hashed_password": "hash{}".format(i),
+                 "session_id": "session-{}".format(i),
+                 "reset_token": "token-{}".format(i)}
+                for i in range(first, min(first + BATCH_SIZE, n))])
+    fill_seconds = time.perf_counter() - start
+    rng = random.Random(0)
+
+    def lookup(column: str, value: str):
+        return lambda i: db.find_user_by(
+            **{column: value.format(rng.randrange(n))})
+
+    return {
+        "users": n,
+        "fill_seconds": round(fill_seconds, 2),
+        "email": _latencies(lookup("email", "user{}@example.com"), LOOKUPS),
+        "session_id": _latencies(lookup("session_id", "session-{}"),
+                                 LOOKUPS),
+        "reset_token": _latencies(lookup("reset_token", "token-{}"),
+                                  LOOKUPS),
+        "hashed_password_scan": _latencies(
+            lookup("hashed_password", "hash{}"), SCANS)
+    }
+
+
+def main():
+    """Measure each size in its own temporary directory."""
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, root)
+    results = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            results.append(measure(n))
+            os.chdir(root)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the user authentication service.
+
+THREADS threads each repeat the lifecycle of a new user through the
+Flask test client for SECONDS: register, log in, view the profile
+PROFILE_VIEWS times and log out. Every response is checked. Reports
+the lifecycles per second, the p50/p99 latency of each request in
+microseconds and the session cache counters, as JSON, and exits with
+status 1 if a check failed.
+
+The app runs over a fresh SQLite database in a temporary directory.
+BCRYPT_ROUNDS defaults to 4 here, so the results show the cost of the
+service rather than of bcrypt, which takes hundreds of milliseconds
+per hash at the production cost of 12.
+
+Usage: python3 -m benchmarks.load_test [SECONDS] [THREADS]
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+
+PROFILE_VIEWS = 5
+
+
+def _timed(latencies: dict, name: str, call):
+    """Return call(), adding its latency to latencies[name]."""
+    start = time.perf_counter()
+    response = call()
+    latencies.setdefault(name, []).append(time.perf_counter() - start)
+    return response
+
+
+def _worker(app, thread: int, deadline: float, latencies: dict,
+            counts: list, errors: list) -> None:
+    """Run user lifecycles until `deadline`."""
+    client = app.test_client()
+    i = 0
+    while time.monotonic() < deadline:
+        form = {"email": "t{}-{}@example.com".format(thread, i),
+                "password": "password {}".format(i)}
+        i += 1
+        try:
+            response = _timed(latencies, "POST /users",
+                              lambda: client.post("/users", data=form))
+            assert response.status_code == 201, response.status_code
+            response = _timed(latencies, "POST /sessions",
+                              lambda: client.post("/sessions", data=form))
+            assert response.status_code == 200, response.status_code
+            for _ in range(PROFILE_VIEWS):
+                response = _timed(latencies, "GET /profile",
+                                  lambda: client.get("/profile"))
+                assert response.get_json() == {"email": form["email"]}
+            response = _timed(latencies, "DELETE /sessions",
+                              lambda: client.delete("/sessions"))
+            assert response.status_code == 200, response.status_code
+            response = client.get("/profile")
+            assert response.status_code == 403, response.status_code
+            counts[thread] += 1
+        except Exception:
+            errors.append(traceback.format_exc())
+
+
+def main():
+    """Serve the app from a temporary directory and load it."""
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, root)
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ.pop("DB_URL", None)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        from app import app, auth
+
+        latencies = [{} for _ in range(threads)]
+        counts = [0] * threads
+        errors = []
+        deadline = time.monotonic() + seconds
+        workers = [threading.Thread(target=_worker,
+                                    args=(app, t, deadline, latencies[t],
+                                          counts, errors))
+                   for t in range(threads)]
+        start = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - start
+        os.chdir(root)
+    requests = {}
+    for name in latencies[0]:
+        values = sorted(v for thread in latencies for v in thread[name])
+        requests[name] = {
+            "calls": len(values),
+            "p50_us": round(values[len(values) // 2] * 1e6, 1),
+            "p99_us": round(values[int(len(values) * 0.99)] * 1e6, 1)
+        }
+    print(json.dumps({
+        "threads": threads,
+        "bcrypt_rounds": int(os.environ["BCRYPT_ROUNDS"]),
+        "lifecycles_per_sec": round(sum(counts) / elapsed, 1),
+        "requests": requests,
+        "session_cache": auth.session_cache.stats(),
+        "errors": errors[:5],
+        "error_count": len(errors)
+    }, indent=2))
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
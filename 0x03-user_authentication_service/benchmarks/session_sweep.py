@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the session sweeper against concurrent logins.
+
+For each batch size, fills a fresh database with N users whose
+sessions expired, then sweeps them while another thread keeps storing
+new sessions, as logins do. Reports the sweep result and the latency
+of the concurrent session writes, as JSON: smaller batches should keep
+the writes fast, at the cost of a longer sweep.
+
+Usage: python3 -m benchmarks.session_sweep [N] [BATCH_SIZE ...]
+"""
+from datetime import datetime, timedelta
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+
+BATCH_SIZE = 10000
+
+
+def measure(n: int, batch_size: int) -> dict:
+    """Sweep the expired sessions of `n` users during logins."""
+    from db import DB
+    from sweeper import SessionSweeper
+    from user import User
+
+    db = DB()
+    expired = datetime.utcnow() - timedelta(days=2)
+    with db._engine.begin() as connection:
+        for first in range(0, n, BATCH_SIZE):
+            connection.execute(User.__table__.insert(), [
+                {"email": "user{}@example.com".format(i),
+                 "hashed_password": "hash",
+                 "session_id": "session-{}".format(i),
+                 "session_created_at": expired}
+                for i in range(first, min(first + BATCH_SIZE, n))])
+    sweeper = SessionSweeper(db, 86400, batch_size=batch_size)
+    done = threading.Event()
+    latencies = []
+
+    def login():
+        i = 0
+        while not done.is_set():
+            start = time.perf_counter()
+            db.update_user(i % 100 + 1, session_id=str(uuid.uuid4()),
+                           session_created_at=datetime.utcnow())
+            db.close_session()
+            latencies.append(time.perf_counter() - start)
+            i += 1
+
+    thread = threading.Thread(target=login)
+    thread.start()
+    result = sweeper.sweep()
+    done.set()
+    thread.join()
+    latencies.sort()
+    result.pop("at")
+    result["batch_size"] = batch_size
+    result["logins_during_sweep"] = len(latencies)
+    result["login_p50_us"] = round(latencies[len(latencies) // 2] * 1e6, 1)
+    result["login_max_us"] = round(latencies[-1] * 1e6, 1)
+    return result
+
+
+def main():
+    """Measure each batch size in its own temporary directory."""
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_sizes = [int(arg) for arg in sys.argv[2:]] or [500, n]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, root)
+    os.environ.pop("DB_URL", None)
+    results = {"users": n, "sweeps": []}
+    for batch_size in batch_sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            results["sweeps"].append(measure(n, batch_size))
+            os.chdir(root)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
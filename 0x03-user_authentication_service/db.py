@@ -2,36 +2,166 @@
 """
 DB module.
 Manages database operations using SQLAlchemy.
+
+The engine is configured from the environment:
+- DB_URL: database URL (default sqlite:///a.db)
+- DB_ECHO: set to 1 to log every SQL statement
+- DB_POOL_SIZE: connections kept open in the pool (default 5)
 """
 
-from sqlalchemy import create_engine
+from datetime import datetime
+from os import getenv
+from typing import List
+from sqlalchemy import create_engine, event, inspect, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import QueuePool, StaticPool
 from user import Base, User
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Use write-ahead logging, so readers do not block the writer,
+    and only sync the log at checkpoints."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def create_db_engine(url: str = None, echo: bool = None) -> Engine:
+    """Create an engine for `url`, DB_URL by default.
+
+    SQLite connections are pooled and may be used from any thread. An
+    in-memory database has a single connection shared by all threads.
+    """
+    if url is None:
+        url = getenv("DB_URL", "sqlite:///a.db")
+    if echo is None:
+        echo = getenv("DB_ECHO") == "1"
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=echo,
+                             pool_size=int(getenv("DB_POOL_SIZE", "5")),
+                             pool_pre_ping=True)
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        return create_engine(url, echo=echo, poolclass=StaticPool,
+                             connect_args={"check_same_thread": False})
+    engine = create_engine(url, echo=echo, poolclass=QueuePool,
+                           pool_size=int(getenv("DB_POOL_SIZE", "5")),
+                           connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
 class DB:
     """DB class for handling database operations."""
 
-    def __init__(self) -> None:
-        """Initialize a new DB instance."""
-        self._engine = create_engine("sqlite:///a.db", echo=True)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+    def __init__(self, url: str = None) -> None:
+        """Initialize a new DB instance.
+
+        Tables, columns and indexes are only created if they are
+        missing, so users are kept across restarts.
+        """
+        self._engine = create_db_engine(url)
+        inspector = inspect(self._engine)
+        if inspector.has_table(User.__tablename__):
+            existing = {column["name"] for column
+                        in inspector.get_columns(User.__tablename__)}
+            with self._engine.begin() as connection:
+                for column in User.__table__.columns:
+                    if column.name not in existing:
+                        connection.exec_driver_sql(
+                            "ALTER TABLE {} ADD COLUMN {} {}".format(
+                                User.__tablename__, column.name,
+                                column.type.compile(self._engine.dialect)))
+            for index in User.__table__.indexes:
+                index.create(self._engine, checkfirst=True)
+        else:
+            Base.metadata.create_all(self._engine)
+        self.__session = scoped_session(
+            sessionmaker(bind=self._engine, expire_on_commit=False))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object."""
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        """Session object of the current thread."""
+        return self.__session()
+
+    def close_session(self) -> None:
+        """Close the session of the current thread, returning its
+        connection to the pool, e.g. at the end of a request."""
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
-        """Adds a new user to the database."""
+        """Adds a new user to the database.
+
+        Raises ValueError if the email is already registered, which the
+        unique index checks atomically.
+        """
         user = User(email=email, hashed_password=hashed_password)
         self._session.add(user)
-        self._session.commit()
+        try:
+            self._session.commit()
+        except IntegrityError:
+            self._session.rollback()
+            raise ValueError("User {} already exists".format(email))
         return user
+
+    def find_user_by(self, **kwargs) -> User:
+        """Returns the first user matching the given column values.
+
+        Lookups by id, email, session_id or reset_token use an index.
+        Raises InvalidRequestError if a key is not a column of users,
+        and NoResultFound if no user matches.
+        """
+        for key in kwargs:
+            if key not in User.__table__.columns:
+                raise InvalidRequestError("Unknown column: {}".format(key))
+        user = self._session.query(User).filter_by(**kwargs).first()
+        if user is None:
+            raise NoResultFound()
+        return user
+
+    def update_user(self, user_id: int, **kwargs) -> None:
+        """Updates the given columns of a user and commits.
+
+        Raises ValueError if a key is not a column of users or if the
+        new email is already registered, and NoResultFound if no user
+        has this id.
+        """
+        user = self.find_user_by(id=user_id)
+        for key in kwargs:
+            if key not in User.__table__.columns:
+                raise ValueError("Unknown column: {}".format(key))
+        for key, value in kwargs.items():
+            setattr(user, key, value)
+        try:
+            self._session.commit()
+        except IntegrityError:
+            self._session.rollback()
+            raise ValueError(
+                "User {} already exists".format(kwargs.get("email")))
+
+    def clear_expired_sessions(self, created_before: datetime,
+                               limit: int) -> List[str]:
+        """Ends at most `limit` sessions created before `created_before`
+        or at an unknown time, in one short transaction.
+
+        Returns the ids of the sessions found, some of which may have
+        been replaced by a new session in the meantime.
+        """
+        expired = or_(User.session_created_at < created_before,
+                      User.session_created_at.is_(None))
+        rows = self._session.query(User.id, User.session_id).filter(
+            User.session_id.isnot(None), expired).limit(limit).all()
+        if not rows:
+            return []
+        self._session.query(User).filter(
+            User.id.in_([row.id for row in rows]), expired).update(
+            {User.session_id: None, User.session_created_at: None},
+            synchronize_session=False)
+        self._session.commit()
+        return [row.session_id for row in rows]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Session cache module.
+A bounded LRU cache with a time-to-live mapping session ids to the id
+and email of their user, so that requests on warm sessions do not
+query the database.
+"""
+
+from collections import OrderedDict
+from typing import Optional, Tuple
+import threading
+import time
+
+
+class SessionCache:
+    """Cache of the users of session ids.
+
+    The cache is written through when a session is created and must be
+    invalidated when a session ends. Entries also expire after `ttl`
+    seconds, which bounds how long a session ended by another process
+    is still accepted here.
+    """
+
+    def __init__(self, capacity: int = 10000, ttl: float = 60) -> None:
+        """Initialize a cache of at most `capacity` sessions, 0
+        disabling it."""
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # session id -> (user id, email, expiry)
+        self._entries = OrderedDict()
+        # user id -> session id, to end the session of a user
+        self._sessions = {}
+        # Incremented on each invalidation, so that a user read from
+        # the database before it is not cached after it
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def version(self) -> int:
+        """Returns the invalidation count, to pass to `put()`."""
+        return self._version
+
+    def get(self, session_id: str) -> Optional[Tuple[int, str]]:
+        """Returns the user id and email of a session, or None on a
+        miss."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(session_id)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, session_id: str, user_id: int, email: str,
+            version: int = None, lifetime: float = None) -> None:
+        """Caches the user of a session, replacing the previous session
+        of the user, unless an invalidation happened since `version`.
+
+        The entry expires after `ttl` seconds, or `lifetime` seconds if
+        the session itself expires sooner.
+        """
+        ttl = self.ttl if lifetime is None else min(self.ttl, lifetime)
+        if self.capacity <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            previous = self._sessions.get(user_id)
+            if previous is not None and previous != session_id:
+                self._remove(previous)
+            self._entries[session_id] = (user_id, email,
+                                         time.monotonic() + ttl)
+            self._entries.move_to_end(session_id)
+            self._sessions[user_id] = session_id
+            while len(self._entries) > self.capacity:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, session_id: str) -> None:
+        """Forgets a session."""
+        with self._lock:
+            self._version += 1
+            self._remove(session_id)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forgets the session of a user."""
+        with self._lock:
+            self._version += 1
+            session_id = self._sessions.get(user_id)
+            if session_id is not None:
+                self._remove(session_id)
+
+    def _remove(self, session_id: str) -> None:
+        """Removes a session, with the lock held."""
+        entry = self._entries.pop(session_id, None)
+        if entry is not None and self._sessions.get(entry[0]) == session_id:
+            del self._sessions[entry[0]]
+
+    def stats(self) -> dict:
+        """Returns the size and usage counters of the cache."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Sweeper module.
+Ends expired sessions in the background, in bounded batches.
+
+Settings:
+- SESSION_SWEEP_INTERVAL: seconds between sweeps (default 60, 0
+  disables the sweeper)
+- SESSION_SWEEP_BATCH_SIZE: sessions ended per transaction (default 500)
+"""
+
+from collections import deque
+from datetime import datetime, timedelta
+from os import getenv
+import threading
+import time
+
+from db import DB
+from session_cache import SessionCache
+
+
+SWEEP_INTERVAL = float(getenv("SESSION_SWEEP_INTERVAL", "60"))
+SWEEP_BATCH_SIZE = int(getenv("SESSION_SWEEP_BATCH_SIZE", "500"))
+# Sweeps kept for stats()
+HISTORY_SIZE = 10
+
+
+class SessionSweeper:
+    """Background thread ending the sessions older than a TTL.
+
+    Each batch is its own short transaction, and the sweeper yields
+    between batches, so it never holds the SQLite write lock for long
+    and logins keep going during a large sweep.
+    """
+
+    def __init__(self, db: DB, session_ttl: float,
+                 session_cache: SessionCache = None,
+                 interval: float = None, batch_size: int = None) -> None:
+        """Initialize a sweeper of the sessions of `db` older than
+        `session_ttl` seconds, also forgotten by `session_cache`."""
+        self._db = db
+        self.session_ttl = session_ttl
+        self.session_cache = session_cache
+        self.interval = SWEEP_INTERVAL if interval is None else interval
+        self.batch_size = SWEEP_BATCH_SIZE if batch_size is None \
+            else batch_size
+        self.sweeps = 0
+        self.swept_total = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def sweep(self) -> dict:
+        """Ends every expired session now, returning how many were
+        ended, in how many batches and how long it took."""
+        start = time.monotonic()
+        created_before = datetime.utcnow() - timedelta(
+            seconds=self.session_ttl)
+        swept = batches = 0
+        longest = 0.0
+        try:
+            while not self._stop.is_set():
+                batch_start = time.monotonic()
+                session_ids = self._db.clear_expired_sessions(
+                    created_before, self.batch_size)
+                longest = max(longest, time.monotonic() - batch_start)
+                if not session_ids:
+                    break
+                batches += 1
+                swept += len(session_ids)
+                if self.session_cache is not None:
+                    for session_id in session_ids:
+                        self.session_cache.invalidate(session_id)
+                if len(session_ids) < self.batch_size:
+                    break
+                # Let waiting writers in between batches
+                time.sleep(0.001)
+        finally:
+            self._db.close_session()
+        result = {
+            "at": datetime.utcnow().isoformat(),
+            "swept": swept,
+            "batches": batches,
+            "seconds": round(time.monotonic() - start, 6),
+            "longest_batch_seconds": round(longest, 6)
+        }
+        with self._lock:
+            self.sweeps += 1
+            self.swept_total += swept
+            self.history.append(result)
+        return result
+
+    def _run(self) -> None:
+        """Sweep every `interval` seconds until stopped."""
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                # Try again at the next sweep, e.g. if the database
+                # was locked for too long
+                pass
+
+    def start(self) -> bool:
+        """Starts sweeping in the background, returning False if
+        sessions do not expire or the sweeper is disabled."""
+        if self.session_ttl <= 0 or self.interval <= 0:
+            return False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name="session-sweeper",
+                                            daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        """Stops sweeping, after the batch in progress."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        """Returns the sweep counters and the last sweeps."""
+        with self._lock:
+            return {
+                "sweeps": self.sweeps,
+                "swept_total": self.swept_total,
+                "last_sweeps": list(self.history)
+            }
@@ -4,7 +4,7 @@ User model module.
 Defines the SQLAlchemy User model.
 """
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 
@@ -16,7 +16,9 @@ class User(Base):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True, index=True)
     hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    session_id = Column(String(250), nullable=True, index=True)
+    # UTC creation time of the session, to expire it
+    session_created_at = Column(DateTime, nullable=True, index=True)
+    reset_token = Column(String(250), nullable=True, index=True)